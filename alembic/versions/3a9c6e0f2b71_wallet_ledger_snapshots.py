@@ -0,0 +1,54 @@
+"""Wallet ledger snapshots
+
+Revision ID: 3a9c6e0f2b71
+Revises: 7d41c9e0b5a2
+Create Date: 2026-10-18 18:12:44.306195
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9c6e0f2b71'
+down_revision: Union[str, Sequence[str], None] = '7d41c9e0b5a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if 'order_id' not in {column['name'] for column in inspector.get_columns('transactions')}:
+        with op.batch_alter_table('transactions') as batch_op:
+            batch_op.add_column(sa.Column('order_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_transactions_order_id', 'orders', ['order_id'], ['id'])
+    if not inspector.has_table('ledger_snapshots'):
+        op.create_table('ledger_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('through_transaction_id', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('wallet_snapshots'):
+        op.create_table('wallet_snapshots',
+        sa.Column('snapshot_id', sa.Integer(), nullable=False),
+        sa.Column('wallet_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('btc_balance_sats', sa.BigInteger(), nullable=True),
+        sa.Column('usd_balance_cents', sa.BigInteger(), nullable=True),
+        sa.Column('last_transaction_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['snapshot_id'], ['ledger_snapshots.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('snapshot_id', 'wallet_id')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('wallet_snapshots')
+    op.drop_table('ledger_snapshots')
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_constraint('fk_transactions_order_id', type_='foreignkey')
+        batch_op.drop_column('order_id')
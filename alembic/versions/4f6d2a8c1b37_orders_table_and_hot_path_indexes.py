@@ -0,0 +1,68 @@
+"""Orders table and hot path indexes
+
+Revision ID: 4f6d2a8c1b37
+Revises: 19b2ead1c5de
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6d2a8c1b37'
+down_revision: Union[str, Sequence[str], None] = '19b2ead1c5de'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The app's startup create_all() may already have created the orders
+    # table, and on a fresh database it also creates the new indexes, so
+    # only add what is missing.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('orders'):
+        op.create_table('orders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('wallet_id', sa.Integer(), nullable=True),
+        sa.Column('order_type', sa.String(), nullable=True),
+        sa.Column('btc_amount', sa.Float(), nullable=True),
+        sa.Column('price_usd', sa.Float(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    orders_indexes = _existing_indexes(inspector, 'orders')
+    if op.f('ix_orders_id') not in orders_indexes:
+        op.create_index(op.f('ix_orders_id'), 'orders', ['id'], unique=False)
+    if op.f('ix_orders_wallet_id') not in orders_indexes:
+        op.create_index(op.f('ix_orders_wallet_id'), 'orders', ['wallet_id'], unique=False)
+    if 'ix_orders_active_type_price' not in orders_indexes:
+        op.create_index(
+            'ix_orders_active_type_price', 'orders', ['order_type', 'price_usd'], unique=False,
+            postgresql_where=sa.text('is_active'),
+            sqlite_where=sa.text('is_active = 1'),
+        )
+    if op.f('ix_wallets_user_id') not in _existing_indexes(inspector, 'wallets'):
+        op.create_index(op.f('ix_wallets_user_id'), 'wallets', ['user_id'], unique=False)
+    if 'ix_transactions_wallet_id_timestamp' not in _existing_indexes(inspector, 'transactions'):
+        op.create_index('ix_transactions_wallet_id_timestamp', 'transactions', ['wallet_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_wallet_id_timestamp', table_name='transactions')
+    op.drop_index(op.f('ix_wallets_user_id'), table_name='wallets')
+    op.drop_index('ix_orders_active_type_price', table_name='orders')
+    op.drop_index(op.f('ix_orders_wallet_id'), table_name='orders')
+    op.drop_index(op.f('ix_orders_id'), table_name='orders')
+    op.drop_table('orders')
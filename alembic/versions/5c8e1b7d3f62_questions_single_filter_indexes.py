@@ -0,0 +1,41 @@
+"""Questions single filter indexes
+
+Revision ID: 5c8e1b7d3f62
+Revises: 3a9c6e0f2b71
+Create Date: 2026-10-18 21:14:52.318064
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e1b7d3f62'
+down_revision: Union[str, Sequence[str], None] = '3a9c6e0f2b71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('questions')}
+    if 'ix_questions_topic_id' not in existing:
+        op.create_index('ix_questions_topic_id', 'questions', ['topic', 'id'], unique=False)
+    # Superseded by ix_questions_topic_id.
+    if 'ix_questions_topic' in existing:
+        op.drop_index('ix_questions_topic', table_name='questions')
+    if 'ix_questions_difficulty_id' not in existing:
+        op.create_index('ix_questions_difficulty_id', 'questions', ['difficulty', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('questions')}
+    if 'ix_questions_topic' not in existing:
+        op.create_index('ix_questions_topic', 'questions', ['topic'], unique=False)
+    if 'ix_questions_difficulty_id' in existing:
+        op.drop_index('ix_questions_difficulty_id', table_name='questions')
+    if 'ix_questions_topic_id' in existing:
+        op.drop_index('ix_questions_topic_id', table_name='questions')
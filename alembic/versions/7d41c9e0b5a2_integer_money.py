@@ -0,0 +1,63 @@
+"""Integer money
+
+Revision ID: 7d41c9e0b5a2
+Revises: e2b9d4c7a613
+Create Date: 2026-10-18 16:05:31.772410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d41c9e0b5a2'
+down_revision: Union[str, Sequence[str], None] = 'e2b9d4c7a613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SATS_PER_BTC = 100_000_000
+CENTS_PER_USD = 100
+
+# table -> [(float column, integer column, units per whole)]
+CONVERSIONS = {
+    'wallets': [('btc_balance', 'btc_balance_sats', SATS_PER_BTC), ('usd_balance', 'usd_balance_cents', CENTS_PER_USD)],
+    'orders': [('btc_amount', 'btc_amount_sats', SATS_PER_BTC), ('price_usd', 'price_cents', CENTS_PER_USD)],
+    'transactions': [('btc_amount', 'btc_amount_sats', SATS_PER_BTC), ('usd_amount', 'usd_amount_cents', CENTS_PER_USD)],
+}
+
+
+def _convert(to_integers: bool):
+    op.drop_index('ix_orders_active_type_price', table_name='orders')
+    for table, columns in CONVERSIONS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for float_column, int_column, _ in columns:
+                if to_integers:
+                    batch_op.add_column(sa.Column(int_column, sa.BigInteger(), nullable=True))
+                else:
+                    batch_op.add_column(sa.Column(float_column, sa.Float(), nullable=True))
+        for float_column, int_column, scale in columns:
+            if to_integers:
+                op.execute(f"UPDATE {table} SET {int_column} = ROUND({float_column} * {scale})")
+            else:
+                op.execute(f"UPDATE {table} SET {float_column} = {int_column} / {float(scale)}")
+        with op.batch_alter_table(table) as batch_op:
+            for float_column, int_column, _ in columns:
+                batch_op.drop_column(float_column if to_integers else int_column)
+    op.create_index(
+        'ix_orders_active_type_price', 'orders', ['order_type', 'price_cents' if to_integers else 'price_usd'], unique=False,
+        postgresql_where=sa.text('is_active'),
+        sqlite_where=sa.text('is_active = 1'),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Amounts become whole satoshis and cents, rounded to the nearest unit.
+    _convert(to_integers=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _convert(to_integers=False)
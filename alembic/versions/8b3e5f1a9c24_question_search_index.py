@@ -0,0 +1,61 @@
+"""Question search index
+
+Revision ID: 8b3e5f1a9c24
+Revises: 4f6d2a8c1b37
+Create Date: 2026-10-18 11:03:27.540193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3e5f1a9c24'
+down_revision: Union[str, Sequence[str], None] = '4f6d2a8c1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copied from app.search as of this revision, so the migration doesn't
+# change when the app does.
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+        question, answer, content='questions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_questions_search ON questions USING gin "
+            "(to_tsvector('simple', (coalesce(question, '') || ' ') || coalesce(answer, '')))"
+        )
+    else:
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        # Fills the index from the existing rows.
+        op.execute("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_questions_search")
+    else:
+        for trigger in ('questions_fts_insert', 'questions_fts_delete', 'questions_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS questions_fts")
@@ -0,0 +1,30 @@
+"""Questions topic/difficulty index
+
+Revision ID: c5a17e2d4f90
+Revises: 8b3e5f1a9c24
+Create Date: 2026-10-18 12:41:09.226815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a17e2d4f90'
+down_revision: Union[str, Sequence[str], None] = '8b3e5f1a9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('questions')}
+    if 'ix_questions_topic_difficulty_id' not in existing:
+        op.create_index('ix_questions_topic_difficulty_id', 'questions', ['topic', 'difficulty', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_questions_topic_difficulty_id', table_name='questions')
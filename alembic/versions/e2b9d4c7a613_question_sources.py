@@ -0,0 +1,48 @@
+"""Question sources
+
+Revision ID: e2b9d4c7a613
+Revises: c5a17e2d4f90
+Create Date: 2026-10-18 14:27:52.904618
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b9d4c7a613'
+down_revision: Union[str, Sequence[str], None] = 'c5a17e2d4f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('questions')}
+    with op.batch_alter_table('questions') as batch_op:
+        if 'source_path' not in columns:
+            batch_op.add_column(sa.Column('source_path', sa.String(), nullable=True))
+        if 'source_key' not in columns:
+            batch_op.add_column(sa.Column('source_key', sa.String(), nullable=True))
+    if 'ix_questions_source' not in {index['name'] for index in inspector.get_indexes('questions')}:
+        op.create_index('ix_questions_source', 'questions', ['source_path', 'source_key'], unique=True)
+    if not inspector.has_table('source_files'):
+        op.create_table('source_files',
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('mtime_ns', sa.BigInteger(), nullable=True),
+        sa.Column('sha256', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('path')
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('source_files')
+    op.drop_index('ix_questions_source', table_name='questions')
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.drop_column('source_key')
+        batch_op.drop_column('source_path')
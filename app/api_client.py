@@ -1,45 +1,141 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
 import httpx
 
-async def get_btc_price_usd() -> float:
-    """Fetches the current price of Bitcoin in USD from the CoinGecko API."""
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
-    async with httpx.AsyncClient() as client:
+from .config import settings
+
+
+@dataclass(frozen=True)
+class PriceQuote:
+    price: float
+    fetched_at: float  # time.monotonic() of the upstream fetch, 0.0 for the fallback price
+    source: str  # "live", "cache" or "fallback"
+    ttl: float
+
+    @property
+    def age(self) -> float:
+        if self.source == "fallback":
+            return float("inf")
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def is_stale(self) -> bool:
+        return self.age > self.ttl
+
+
+class PriceFeed:
+    """BTC/USD price source shared by the API and the worker.
+
+    Each feed keeps one pooled `httpx` client per calling context (a sync
+    client, plus an async client per event loop) and caches the last good
+    price for `ttl` seconds. Callers that miss the cache at the same time
+    share one upstream request. When CoinGecko fails, the last good price is
+    served again, marked stale, and the configured fallback price is only used
+    if no price was ever fetched.
+    """
+
+    def __init__(
+        self,
+        url: str = settings.BTC_PRICE_URL,
+        ttl: float = settings.BTC_PRICE_CACHE_TTL_SECONDS,
+        fallback_price: float = settings.BTC_PRICE_FALLBACK_USD,
+        timeout: float = settings.BTC_PRICE_TIMEOUT_SECONDS,
+        max_connections: int = settings.BTC_PRICE_MAX_CONNECTIONS,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.fallback_price = fallback_price
+        self._timeout = httpx.Timeout(timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._last: Optional[PriceQuote] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_lock = threading.Lock()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+    def _cached(self) -> Optional[PriceQuote]:
+        last = self._last
+        if last is not None and not last.is_stale:
+            return PriceQuote(last.price, last.fetched_at, "cache", last.ttl)
+        return None
+
+    def _parse(self, response: httpx.Response) -> PriceQuote:
+        response.raise_for_status()
+        price = response.json().get("bitcoin", {}).get("usd")
+        if price is None:
+            raise ValueError("BTC price not found in CoinGecko API response")
+        quote = PriceQuote(float(price), time.monotonic(), "live", self.ttl)
+        self._last = quote
+        return quote
+
+    def _on_error(self, error: Exception) -> PriceQuote:
+        print(f"Error fetching BTC price: {error}")
+        if self._last is not None:
+            return PriceQuote(self._last.price, self._last.fetched_at, "cache", self.ttl)
+        return PriceQuote(self.fallback_price, 0.0, "fallback", self.ttl)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # An AsyncClient's connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+            self._async_loop = loop
+            self._inflight = None
+        return self._async_client
+
+    async def _fetch(self) -> PriceQuote:
         try:
-            response = await client.get(url)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            data = response.json()
-            price = data.get("bitcoin", {}).get("usd")
-            if price is None:
-                # Fallback or error handling if the price is not in the response
-                raise ValueError("BTC price not found in CoinGecko API response")
-            return float(price)
-        except (httpx.RequestError, ValueError) as e:
-            # In a real production app, you might have a more robust fallback,
-            # like using a cached price or another API.
-            # For now, we'll re-raise or handle it as a server error.
-            print(f"Error fetching BTC price: {e}")
-            # Fallback to a default price if the API fails, to prevent transactions from failing completely.
-            # This could also be a configurable value.
-            return 50000.0
+            return self._parse(await self._get_async_client().get(self.url))
+        except (httpx.HTTPError, ValueError) as e:
+            return self._on_error(e)
+
+    async def get_quote(self) -> PriceQuote:
+        cached = self._cached()
+        if cached is not None:
+            return cached
+        self._get_async_client()
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        return await asyncio.shield(self._inflight)
+
+    def get_quote_sync(self) -> PriceQuote:
+        cached = self._cached()
+        if cached is not None:
+            return cached
+        with self._sync_lock:
+            cached = self._cached()  # another thread may have refreshed it meanwhile
+            if cached is not None:
+                return cached
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(timeout=self._timeout, limits=self._limits)
+            try:
+                return self._parse(self._sync_client.get(self.url))
+            except (httpx.HTTPError, ValueError) as e:
+                return self._on_error(e)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    def close(self):
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+price_feed = PriceFeed()
+
+async def get_btc_price_usd() -> float:
+    """Returns the current price of Bitcoin in USD, served from the shared price feed."""
+    return (await price_feed.get_quote()).price
 
 def get_btc_price_usd_sync() -> float:
-    """Fetches the current price of Bitcoin in USD from the CoinGecko API."""
-    url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
-    with httpx.Client() as client:
-        try:
-            response = client.get(url)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            data = response.json()
-            price = data.get("bitcoin", {}).get("usd")
-            if price is None:
-                # Fallback or error handling if the price is not in the response
-                raise ValueError("BTC price not found in CoinGecko API response")
-            return float(price)
-        except (httpx.RequestError, ValueError) as e:
-            # In a real production app, you might have a more robust fallback,
-            # like using a cached price or another API.
-            # For now, we'll re-raise or handle it as a server error.
-            print(f"Error fetching BTC price: {e}")
-            # Fallback to a default price if the API fails, to prevent transactions from failing completely.
-            # This could also be a configurable value.
-            return 50000.0
+    """Returns the current price of Bitcoin in USD, served from the shared price feed."""
+    return price_feed.get_quote_sync().price
@@ -1,8 +1,15 @@
+import datetime
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models, database, security
 from .config import settings
@@ -19,9 +26,61 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
+    expires_at: float | None = None
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as the routers need it: ids only, no ORM state."""
+    id: int
+    username: str
+    wallet_id: Optional[int]
+
+class PrincipalCache:
+    """Bounded LRU of principals keyed by token subject.
+
+    An entry lives for at most `ttl` seconds and never past the expiry of the
+    token that loaded it. The cache is per process, so user changes must call
+    `invalidate` on every process that may hold the entry, and the TTL bounds
+    how long any process that missed the call can serve a stale entry.
+    """
+
+    def __init__(self, maxsize: int = settings.PRINCIPAL_CACHE_SIZE, ttl: float = settings.PRINCIPAL_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[subject]
+            return None
+        self._entries.move_to_end(subject)
+        return principal
+
+    def put(self, subject: str, principal: Principal, token_expires_at: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        self._entries[subject] = (principal, expires_at)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        self._entries.pop(subject, None)
+
+    def clear(self):
+        self._entries.clear()
+
+principal_cache = PrincipalCache()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
+    if "exp" not in to_encode:
+        to_encode["exp"] = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -31,19 +90,31 @@ def verify_token(token: str, credentials_exception):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=username, expires_at=payload.get("exp"))
     except JWTError:
         raise credentials_exception
     return token_data
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
+    principal = principal_cache.get(token_data.username)
+    if principal is not None:
+        return principal
+
+    row = (await db.execute(
+        select(models.User.id, models.User.username, models.Wallet.id)
+        .outerjoin(models.Wallet, models.Wallet.user_id == models.User.id)
+        .where(models.User.username == token_data.username)
+        .limit(1)
+    )).first()
+    if row is None:
         raise credentials_exception
-    return user
+    principal = Principal(*row)
+    if principal.wallet_id is not None:
+        principal_cache.put(token_data.username, principal, token_data.expires_at)
+    return principal
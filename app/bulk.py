@@ -0,0 +1,187 @@
+"""Bulk writes to the question bank.
+
+A batch is applied in one transaction with a handful of multi-row statements
+(one lookup per IN_CLAUSE_CHUNK ids, one executemany UPDATE and at most two
+INSERTs) however many questions it holds, instead of a commit and a refresh
+per question.
+"""
+from typing import Iterable, List, Optional, Tuple, Union
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import bindparam, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+
+IN_CLAUSE_CHUNK = 5000
+
+questions_table = models.Question.__table__
+
+QUESTION_FIELDS = ("question", "answer", "topic", "difficulty")
+
+replace_question = (
+    questions_table.update()
+    .where(questions_table.c.id == bindparam("b_id"))
+    .values({field: bindparam(f"b_{field}") for field in QUESTION_FIELDS})
+)
+
+UPSERT_ITEM = TypeAdapter(schemas.QuestionUpsert)
+ID_ITEM = TypeAdapter(int)
+
+# A parsed batch: each entry is either a valid value or the reason it isn't.
+Parsed = List[Tuple[int, Union[object, str]]]
+
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _validate(values: Iterable, adapter: TypeAdapter) -> Parsed:
+    parsed = []
+    for index, value in enumerate(values):
+        if isinstance(value, ValueError):
+            parsed.append((index, f"Invalid JSON: {value}"))
+            continue
+        try:
+            parsed.append((index, adapter.validate_python(value)))
+        except ValidationError as e:
+            parsed.append((index, "; ".join(error["msg"] for error in e.errors())))
+    return parsed
+
+
+def parse_upserts(values: Iterable) -> Parsed:
+    return _validate(values, UPSERT_ITEM)
+
+
+def parse_ids(values: Iterable) -> Parsed:
+    return _validate(values, ID_ITEM)
+
+
+def _summarize(items: List[schemas.BulkItemResult]) -> schemas.BulkResult:
+    result = schemas.BulkResult(items=items)
+    for item in items:
+        if item.status == "created":
+            result.created += 1
+        elif item.status == "updated":
+            result.updated += 1
+        elif item.status == "deleted":
+            result.deleted += 1
+        else:
+            result.failed += 1
+    return result
+
+
+async def _existing_ids(db: AsyncSession, ids: List[int]) -> set:
+    existing = set()
+    for chunk in _chunks(ids):
+        existing.update(await db.scalars(select(models.Question.id).where(models.Question.id.in_(chunk))))
+    return existing
+
+
+def advance_id_sequence_statement(sequence: str):
+    """Moves `sequence` (the questions id sequence) past every id in the table, never backwards.
+
+    Rows inserted with explicit ids don't move the Postgres sequence, so the
+    next insert without an id would collide with them. Ids handed out to
+    concurrent inserts, or to rows since deleted, are never reissued, and an
+    empty table leaves the sequence valid.
+    """
+    return text(
+        "SELECT setval(:sequence, GREATEST(COALESCE((SELECT max(id) FROM questions), 1), "
+        f"(SELECT last_value FROM {sequence})))"
+    ).bindparams(sequence=sequence)
+
+
+id_sequence_name = select(func.pg_get_serial_sequence("questions", "id"))
+
+
+async def _advance_id_sequence(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(advance_id_sequence_statement(await db.scalar(id_sequence_name)))
+
+
+async def upsert_questions(db: AsyncSession, parsed: Parsed) -> schemas.BulkResult:
+    """Applies a batch of upserts in one transaction and reports each item's outcome.
+
+    Items that failed validation, or repeat an id seen earlier in the batch,
+    are reported as invalid and skipped; the rest are written. A database
+    error rolls the whole batch back and is re-raised.
+    """
+    results: List[Optional[schemas.BulkItemResult]] = [None] * len(parsed)
+    valid = []
+    seen_ids = set()
+    for index, item in parsed:
+        if isinstance(item, str):
+            results[index] = schemas.BulkItemResult(index=index, status="invalid", detail=item)
+        elif item.id is not None and item.id in seen_ids:
+            results[index] = schemas.BulkItemResult(index=index, id=item.id, status="invalid", detail="Duplicate id in batch")
+        else:
+            if item.id is not None:
+                seen_ids.add(item.id)
+            valid.append((index, item))
+
+    existing = await _existing_ids(db, list(seen_ids))
+    updates, inserts_with_id, inserts = [], [], []
+    for index, item in valid:
+        if item.id in existing:
+            updates.append((index, item))
+        elif item.id is not None:
+            inserts_with_id.append((index, item))
+        else:
+            inserts.append((index, item))
+
+    try:
+        if updates:
+            await db.execute(
+                replace_question,
+                [{"b_id": item.id, **{f"b_{field}": getattr(item, field) for field in QUESTION_FIELDS}} for _, item in updates],
+            )
+        if inserts_with_id:
+            await db.execute(insert(questions_table), [item.model_dump() for _, item in inserts_with_id])
+            await _advance_id_sequence(db)
+        new_ids = []
+        if inserts:
+            new_ids = (await db.scalars(
+                insert(questions_table).returning(questions_table.c.id, sort_by_parameter_order=True),
+                [item.model_dump(exclude={"id"}) for _, item in inserts],
+            )).all()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    for index, item in updates:
+        results[index] = schemas.BulkItemResult(index=index, id=item.id, status="updated")
+    for index, item in inserts_with_id:
+        results[index] = schemas.BulkItemResult(index=index, id=item.id, status="created")
+    for (index, _), new_id in zip(inserts, new_ids):
+        results[index] = schemas.BulkItemResult(index=index, id=new_id, status="created")
+    return _summarize(results)
+
+
+async def delete_questions(db: AsyncSession, parsed: Parsed) -> schemas.BulkResult:
+    """Deletes a batch of question ids in one transaction and reports each item's outcome."""
+    ids = list({item for _, item in parsed if not isinstance(item, str)})
+    deleted = set()
+    try:
+        for chunk in _chunks(ids):
+            deleted.update(await db.scalars(
+                questions_table.delete().where(questions_table.c.id.in_(chunk)).returning(questions_table.c.id)
+            ))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    results = []
+    reported = set()
+    for index, item in parsed:
+        if isinstance(item, str):
+            results.append(schemas.BulkItemResult(index=index, status="invalid", detail=item))
+        elif item in deleted and item not in reported:
+            reported.add(item)
+            results.append(schemas.BulkItemResult(index=index, id=item, status="deleted"))
+        else:
+            results.append(schemas.BulkItemResult(index=index, id=item, status="not_found"))
+    return _summarize(results)
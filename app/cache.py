@@ -0,0 +1,264 @@
+"""Read-through cache of serialized question responses.
+
+Entries are the exact bytes sent to the client, so a hit skips both the
+database and Pydantic. Lookups try a per-process LRU first and then, when
+QUESTION_CACHE_REDIS_URL is set, a Redis tier shared by every process. Writes
+invalidate the entries they affect in both tiers. Other processes' LRUs only
+learn of a write when their entries expire, so QUESTION_CACHE_TTL_SECONDS
+bounds how stale a multi-process deployment can be; the Redis tier itself is
+always current.
+
+Every invalidation also bumps a generation counter, in this process and in
+Redis. A read-through takes the generation before it reads the database and
+hands it to `put`, which drops the response if a write has invalidated the
+cache since, so a slow read can't put back what the write just removed. If
+Redis fails, the error is counted and the cache carries on with this
+process's tier alone.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from .config import settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # the Redis tier is optional
+    aioredis = None
+
+    class RedisError(Exception):
+        pass
+
+KEY_PREFIX = "question-cache:"
+GENERATION_KEY = KEY_PREFIX + "generation"
+
+# Sets the entry, and adds it to its group when there is one, only while the
+# generation is still the one the response was read at.
+PUT_IF_CURRENT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+if KEYS[3] then
+    redis.call('SADD', KEYS[3], ARGV[4])
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+end
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return self.headers["ETag"]
+
+    @classmethod
+    def build(cls, body: bytes, headers: Optional[Dict[str, str]] = None) -> "CachedResponse":
+        headers = dict(headers or {})
+        headers["ETag"] = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        return cls(body, headers)
+
+    def dumps(self) -> bytes:
+        return json.dumps(self.headers).encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "CachedResponse":
+        headers, body = raw.split(b"\n", 1)
+        return cls(body, json.loads(headers))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ResponseCache:
+    """Two-tier cache of `CachedResponse`s.
+
+    Keys can be put in a group, such as every cached list page, so that one
+    write can drop the whole group without knowing which keys it holds. A
+    key leaves its group when it is evicted or expires, and a group's Redis
+    set expires with the last key added to it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.QUESTION_CACHE_SIZE,
+        ttl: float = settings.QUESTION_CACHE_TTL_SECONDS,
+        redis_url: Optional[str] = settings.QUESTION_CACHE_REDIS_URL,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._groups: Dict[str, set] = {}
+        self._generation = 0
+        self._redis = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.not_modified = 0
+        self.stale_puts = 0
+        self.redis_errors = 0
+
+    def _get_redis(self):
+        if self.redis_url is None:
+            return None
+        if aioredis is None:
+            raise ImportError("QUESTION_CACHE_REDIS_URL is set but the redis package is not installed")
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    def _get_local(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._drop_local(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _put_local(self, key: str, response: CachedResponse, group: Optional[str]):
+        self._drop_local(key)
+        self._entries[key] = (response, time.monotonic() + self.ttl, group)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._drop_local(next(iter(self._entries)))
+
+    def _drop_local(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[2] is not None:
+            members = self._groups.get(entry[2])
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._groups[entry[2]]
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        response = self._get_local(key)
+        if response is not None:
+            self.local_hits += 1
+            return response
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(KEY_PREFIX + key)
+            except RedisError:
+                self.redis_errors += 1
+                raw = None
+            if raw is not None:
+                self.redis_hits += 1
+                response = CachedResponse.loads(raw)
+                self._put_local(key, response, None)
+                return response
+        self.misses += 1
+        return None
+
+    async def generation(self) -> tuple:
+        """The cache's current generation, to be taken before a read-through and passed to `put`."""
+        redis = self._get_redis()
+        redis_generation = None
+        if redis is not None:
+            try:
+                redis_generation = (await redis.get(GENERATION_KEY) or b"0").decode()
+            except RedisError:
+                self.redis_errors += 1
+        return self._generation, redis_generation
+
+    async def put(
+        self,
+        key: str,
+        response: CachedResponse,
+        group: Optional[str] = None,
+        generation: Optional[tuple] = None,
+    ):
+        """Caches `response`, unless the cache was invalidated since `generation` was taken."""
+        if generation is not None and generation[0] != self._generation:
+            self.stale_puts += 1
+            return
+        self._put_local(key, response, group)
+        redis = self._get_redis()
+        if redis is None or (generation is not None and generation[1] is None):
+            return
+        ttl = max(1, int(self.ttl))
+        try:
+            if generation is not None:
+                keys = [GENERATION_KEY, KEY_PREFIX + key]
+                if group is not None:
+                    keys.append(KEY_PREFIX + "group:" + group)
+                if not await redis.eval(PUT_IF_CURRENT, len(keys), *keys, generation[1], response.dumps(), ttl, key):
+                    self.stale_puts += 1
+                    self._drop_local(key)
+                return
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.set(KEY_PREFIX + key, response.dumps(), ex=ttl)
+                if group is not None:
+                    pipe.sadd(KEY_PREFIX + "group:" + group, key)
+                    pipe.expire(KEY_PREFIX + "group:" + group, ttl)
+                await pipe.execute()
+        except RedisError:
+            self.redis_errors += 1
+
+    async def invalidate(self, keys: Iterable[str] = (), groups: Iterable[str] = ()):
+        keys = set(keys)
+        groups = list(groups)
+        self._generation += 1
+        for group in groups:
+            keys |= self._groups.pop(group, set())
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.incr(GENERATION_KEY)
+                for group in groups:
+                    group_key = KEY_PREFIX + "group:" + group
+                    keys |= {member.decode() for member in await redis.smembers(group_key)}
+                    await redis.delete(group_key)
+                if keys:
+                    await redis.delete(*(KEY_PREFIX + key for key in keys))
+            except RedisError:
+                self.redis_errors += 1
+        for key in keys:
+            self._drop_local(key)
+        self.invalidations += 1
+
+    def metrics(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+            "redis_errors": self.redis_errors,
+        }
+
+    def clear(self):
+        """Empties this process's tier."""
+        self._entries.clear()
+        self._groups.clear()
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+question_cache = ResponseCache()
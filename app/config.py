@@ -2,11 +2,49 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql://user:password@db:5432/mydatabase"
+    DATABASE_POOL_SIZE: int = 20
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_PRE_PING: bool = True
     SECRET_KEY: str = "your_secret_key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 300.0
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    METRICS_TOKEN: str | None = None
     CELERY_BROKER_URL: str = "redis://redis:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://redis:6379/0"
+    BTC_PRICE_URL: str = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+    BTC_PRICE_CACHE_TTL_SECONDS: float = 5.0
+    BTC_PRICE_FALLBACK_USD: float = 50000.0
+    BTC_PRICE_TIMEOUT_SECONDS: float = 5.0
+    BTC_PRICE_MAX_CONNECTIONS: int = 10
+    PRICE_POLL_INTERVAL_SECONDS: float = 1.0
+    PRICE_TICK_HEARTBEAT_SECONDS: float = 30.0
+    MATCH_MIN_INTERVAL_SECONDS: float = 0.5
+    ORDER_BOOK_SETTLE_SECONDS: float = 5.0
+    MATCHER_SHARDS: int = 1
+    TRANSACTIONS_PAGE_SIZE: int = 100
+    TRANSACTIONS_MAX_PAGE_SIZE: int = 1000
+    TRANSACTIONS_EXPORT_CHUNK_SIZE: int = 1000
+    QUESTIONS_PAGE_SIZE: int = 10
+    QUESTIONS_MAX_PAGE_SIZE: int = 1000
+    QUESTION_CACHE_SIZE: int = 10000
+    QUESTION_CACHE_TTL_SECONDS: float = 60.0
+    QUESTION_CACHE_REDIS_URL: str | None = None
+    QUESTION_SAMPLER_REFRESH_SECONDS: float = 300.0
+    QUESTION_SAMPLE_MAX: int = 100
+    QUESTION_BULK_MAX_BYTES: int = 10 * 1024 * 1024
+    LEDGER_ENABLED: bool = False
+    LEDGER_POLL_INTERVAL_SECONDS: float = 1.0
+    LEDGER_SETTLE_SECONDS: float = 5.0
+    LEDGER_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    LEDGER_REPLAY_CHUNK_SIZE: int = 10000
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_WINDOW_MS: float = 2.0
+    GROUP_COMMIT_MAX_BATCH: int = 64
 
     model_config = SettingsConfigDict(env_file=".env")
 
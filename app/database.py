@@ -1,16 +1,48 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """Maps a sync database URL onto the matching asyncio driver."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+# The Celery worker, the matcher and the scripts stay on the sync engine; the
+# API routers use the async one so queries never block the event loop.
+sync_engine_options = {}
+if make_url(settings.DATABASE_URL).get_dialect().driver == "psycopg2":
+    # Lets the matcher's executemany UPDATEs go out in pages instead of one
+    # round-trip per row.
+    sync_engine_options["executemany_mode"] = "values_plus_batch"
+
 engine = create_engine(
-    settings.DATABASE_URL
+    settings.DATABASE_URL, **sync_engine_options
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,128 @@
+"""Group commit for trades.
+
+Each trade on its own pays for a commit, and under load the database spends
+most of its time flushing those commits to disk. With GROUP_COMMIT_ENABLED,
+`/buy/` and `/sell/` hand their trade to a single writer coroutine instead.
+The writer takes the first trade waiting, gathers whatever else arrives
+within GROUP_COMMIT_WINDOW_MS (or until GROUP_COMMIT_MAX_BATCH trades are
+waiting), applies them all in one transaction and commits once. Every
+caller then gets back its own result, so a trade its wallet can't cover
+still comes back as None without failing the rest of the batch.
+
+If the batch transaction fails, it is rolled back and its trades are
+retried one transaction each, so an error reaches only the caller whose
+trade caused it. A caller waits at most about one window longer than it
+would have without the writer.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from . import database, models, trades
+from .config import settings
+
+Pending = Tuple[trades.Trade, asyncio.Future]
+
+
+class GroupCommitter:
+    def __init__(
+        self,
+        window: float = settings.GROUP_COMMIT_WINDOW_MS / 1000,
+        max_batch: int = settings.GROUP_COMMIT_MAX_BATCH,
+        session_factory=None,
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        # Looked up at commit time by default, so tests can swap the engine.
+        self.session_factory = session_factory
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.trades = 0
+        self.largest_batch = 0
+        self.retried_batches = 0
+
+    def _start(self):
+        # The writer belongs to an event loop, so a new loop gets a new writer.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._writer is None or self._writer.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._writer = loop.create_task(self._run(self._queue, self._full))
+
+    async def submit(self, trade: trades.Trade) -> Optional[models.Wallet]:
+        """Queues `trade` for the next group commit and returns its result, as `trades.execute` would."""
+        self._start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((trade, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self, queue: asyncio.Queue, full: asyncio.Event):
+        while True:
+            batch = [await queue.get()]
+            if queue.qsize() + 1 < self.max_batch:
+                try:
+                    await asyncio.wait_for(full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            full.clear()
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            if queue.qsize() >= self.max_batch:
+                full.set()
+            # Callers that gave up while queued get nothing written.
+            batch = [pending for pending in batch if not pending[1].done()]
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: List[Pending]):
+        self.batches += 1
+        self.trades += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        session_factory = self.session_factory or database.AsyncSessionLocal
+        try:
+            async with session_factory() as db:
+                results = [await trades.apply(db, trade) for trade, _ in batch]
+                await db.commit()
+        except Exception:
+            self.retried_batches += 1
+            for trade, future in batch:
+                try:
+                    async with session_factory() as db:
+                        result = await trades.execute(db, trade)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            return
+        for (_, future), result in zip(batch, results):
+            wallet = None if result is None else trades.committed(*result)
+            if not future.done():
+                future.set_result(wallet)
+
+    async def aclose(self):
+        if self._writer is not None and not self._writer.done() and self._loop is asyncio.get_running_loop():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+
+    def metrics(self) -> dict:
+        return {
+            "batches": self.batches,
+            "trades": self.trades,
+            "largest_batch": self.largest_batch,
+            "mean_batch": self.trades / self.batches if self.batches else 0.0,
+            "retried_batches": self.retried_batches,
+        }
+
+
+trade_committer = GroupCommitter()
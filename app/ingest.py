@@ -0,0 +1,221 @@
+"""Parallel JSONL decoding shared by the data loading scripts.
+
+A file is cut into byte ranges that end on line boundaries. The ranges are
+decoded and validated in a process pool and handed, in file order, to a
+single writer thread through a bounded queue. The pool only runs a few
+chunks ahead of the writer, and the writer always has the next decoded chunk
+waiting, so parsing scales across cores without holding the whole file in
+memory.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional faster backend
+    orjson = None
+
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+QUESTION_COLUMNS = ("id", "question", "answer", "topic", "difficulty")
+
+
+@dataclass
+class Chunk:
+    start: int
+    end: int
+    records: list
+    errors: int = 0
+
+
+@dataclass
+class PipelineStats:
+    chunks: int = 0
+    records: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    end_offset: int = 0
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+
+def question_row(record: dict) -> Optional[dict]:
+    """Keeps the questions table columns of a record, or rejects it if one is missing or mistyped.
+
+    The id must be an int and every other column a string, so a bad line is
+    counted as an error here rather than failing its whole batch's INSERT.
+    """
+    try:
+        row = {column: record[column] for column in QUESTION_COLUMNS}
+    except (KeyError, TypeError):
+        return None
+    if type(row["id"]) is not int:  # bool is an int subclass, but not an id
+        return None
+    if not all(isinstance(row[column], str) for column in QUESTION_COLUMNS[1:]):
+        return None
+    return row
+
+
+def get_loads(json_backend: str = "auto") -> Callable[[bytes], object]:
+    if json_backend == "orjson" or (json_backend == "auto" and orjson is not None):
+        if orjson is None:
+            raise ImportError("The orjson backend was requested but orjson is not installed")
+        return orjson.loads
+    return json.loads
+
+
+def split_ranges(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, start_offset: int = 0) -> List[Tuple[int, int]]:
+    """Cuts `path` from `start_offset` into byte ranges of about `chunk_bytes` that end on a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        start = start_offset
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def decode_range(path: str, start: int, end: int, handler: Callable[[dict], object], json_backend: str = "auto") -> Chunk:
+    """Decodes the lines in [start, end) of `path` and passes each record through `handler`.
+
+    Lines that are not valid JSON or not a JSON object, and records the
+    handler maps to None, are counted as errors.
+    """
+    loads = get_loads(json_backend)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    records = []
+    errors = 0
+    for line in data.split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            record = handler(record)
+        else:
+            record = None
+        if record is None:
+            errors += 1
+        else:
+            records.append(record)
+    return Chunk(start, end, records, errors)
+
+
+def iter_chunks(
+    path: str,
+    handler: Callable[[dict], object],
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    start_offset: int = 0,
+    json_backend: str = "auto",
+    max_pending: Optional[int] = None,
+) -> Iterator[Chunk]:
+    """Yields the decoded chunks of `path` in file order.
+
+    With `workers` == 0 the chunks are decoded in this process. Otherwise at
+    most `max_pending` chunks (twice the worker count by default) are
+    submitted ahead of the one being consumed, which bounds memory when the
+    consumer is slower than the pool.
+    """
+    ranges = split_ranges(path, chunk_bytes, start_offset)
+    if workers == 0:
+        for start, end in ranges:
+            yield decode_range(path, start, end, handler, json_backend)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        ranges = iter(ranges)
+        for start, end in ranges:
+            pending.append(executor.submit(decode_range, path, start, end, handler, json_backend))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            chunk = pending.pop(0).result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(executor.submit(decode_range, path, *next_range, handler, json_backend))
+            yield chunk
+
+
+def run_pipeline(
+    path: str,
+    handler: Callable[[dict], object],
+    write: Callable[[Chunk], None],
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    start_offset: int = 0,
+    json_backend: str = "auto",
+    queue_size: int = 4,
+) -> PipelineStats:
+    """Decodes `path` in parallel and calls `write` once per chunk, in file order, from one thread.
+
+    Decoded chunks wait in a queue of `queue_size`, so the writer never
+    waits on the parser unless parsing is the bottleneck. When the writer
+    falls behind, the full queue stops the pool from running further ahead.
+    An exception raised by `write` stops the pipeline and is re-raised here.
+    """
+    stats = PipelineStats(end_offset=start_offset)
+    chunks: "queue.Queue[Optional[Chunk]]" = queue.Queue(maxsize=queue_size)
+    failure = []
+
+    def writer():
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            try:
+                write(chunk)
+            except BaseException as e:
+                failure.append(e)
+                return
+            stats.chunks += 1
+            stats.records += len(chunk.records)
+            stats.errors += chunk.errors
+            stats.end_offset = chunk.end
+
+    def send(item: Optional[Chunk]):
+        # Gives up once the writer has stopped, as nothing will drain the queue.
+        while thread.is_alive():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=writer, name="ingest-writer", daemon=True)
+    thread.start()
+    try:
+        for chunk in iter_chunks(path, handler, workers, chunk_bytes, start_offset, json_backend):
+            send(chunk)
+            if failure:
+                break
+    finally:
+        # Stops the writer even when decoding raised.
+        send(None)
+        thread.join()
+    stats.elapsed = time.perf_counter() - started
+    if failure:
+        raise failure[0]
+    return stats
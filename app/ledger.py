@@ -0,0 +1,343 @@
+"""Wallet balances as a projection of the trade ledger.
+
+Every trade is already an append-only `transactions` row: a buy, a sell, or
+an order fill (a buy or sell with `order_id` set). A wallet's balance is its
+opening balance with those events folded over it, so the balances can be
+held in memory and read in O(1), kept current by replaying the events
+appended since the last look.
+
+Restarting doesn't replay the whole history. The worker periodically copies
+every wallet's balance into a compact snapshot (`snapshot_wallets`), and a
+process starts from the newest snapshot and replays only the events of
+about the last snapshot interval. A wallet with no snapshot entry, such as one opened since, is seeded
+from its wallet row instead.
+
+Transaction ids don't commit in id order across wallets, so a tail that only
+ever read past the highest id seen could skip a slow transaction. Within one
+wallet they do: a trade locks the wallet row before it inserts its
+transaction, so the wallet's next trade can't get an id until it commits.
+The projection therefore keeps the newest event id applied to each wallet
+and ignores anything at or below it, which makes reading an event twice
+harmless, and the tail re-reads everything newer than LEDGER_SETTLE_SECONDS
+so a transaction that commits out of order inside that window is still
+seen.
+"""
+import asyncio
+import datetime
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import database, models
+from .config import settings
+from .money import CENTS_PER_USD, SATS_PER_BTC, unit_property
+
+IN_CLAUSE_CHUNK = 5000
+
+transactions_table = models.Transaction.__table__
+wallets_table = models.Wallet.__table__
+wallet_snapshots_table = models.WalletSnapshot.__table__
+ledger_snapshots_table = models.LedgerSnapshot.__table__
+
+
+def newest_transaction_of_wallet():
+    """The id of the wallet row's newest transaction, as a correlated subquery."""
+    return (
+        select(func.max(transactions_table.c.id))
+        .where(transactions_table.c.wallet_id == wallets_table.c.id)
+        .scalar_subquery()
+    )
+
+
+def settled_transaction_id(db: Session, settle_seconds: float) -> int:
+    """The newest transaction id older than `settle_seconds`, below which replay can start."""
+    settled_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=settle_seconds)
+    return db.scalar(
+        select(func.max(transactions_table.c.id)).where(transactions_table.c.timestamp < settled_before)
+    ) or 0
+
+
+def write_snapshot(db: Session, settle_seconds: float = settings.LEDGER_SNAPSHOT_INTERVAL_SECONDS) -> int:
+    """Writes a snapshot of every wallet, drops the older ones and commits; returns the new snapshot's id.
+
+    The snapshot is copied from the wallet rows, each with its newest
+    transaction id, by one INSERT ... SELECT, so every entry is exactly
+    what the database had committed at that statement and none depends on
+    a projection's cursor. Replay from the snapshot re-reads the last
+    `settle_seconds` of transactions, by default a whole snapshot interval,
+    which the entries already holding them ignore; a slow transaction
+    committing out of id order is missed only if it takes longer than that.
+    """
+    snapshot_id = db.execute(
+        insert(ledger_snapshots_table)
+        .values(through_transaction_id=settled_transaction_id(db, settle_seconds))
+        .returning(ledger_snapshots_table.c.id)
+    ).scalar_one()
+    db.execute(
+        insert(wallet_snapshots_table).from_select(
+            ["snapshot_id", "wallet_id", "user_id", "btc_balance_sats", "usd_balance_cents", "last_transaction_id"],
+            select(
+                literal(snapshot_id),
+                wallets_table.c.id,
+                wallets_table.c.user_id,
+                wallets_table.c.btc_balance_sats,
+                wallets_table.c.usd_balance_cents,
+                func.coalesce(newest_transaction_of_wallet(), 0),
+            ),
+        )
+    )
+    db.execute(delete(wallet_snapshots_table).where(wallet_snapshots_table.c.snapshot_id < snapshot_id))
+    db.execute(delete(ledger_snapshots_table).where(ledger_snapshots_table.c.id < snapshot_id))
+    db.commit()
+    return snapshot_id
+
+
+class WalletState:
+    """A wallet's balances as of its transaction `last_transaction_id`."""
+
+    __slots__ = ("id", "user_id", "btc_balance_sats", "usd_balance_cents", "last_transaction_id")
+
+    def __init__(self, id: int, user_id: int, btc_balance_sats: int, usd_balance_cents: int, last_transaction_id: int):
+        self.id = id
+        self.user_id = user_id
+        self.btc_balance_sats = btc_balance_sats
+        self.usd_balance_cents = usd_balance_cents
+        self.last_transaction_id = last_transaction_id
+
+    btc_balance = unit_property("btc_balance_sats", SATS_PER_BTC)
+    usd_balance = unit_property("usd_balance_cents", CENTS_PER_USD)
+
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class WalletLedger:
+    def __init__(
+        self,
+        settle_seconds: float = settings.LEDGER_SETTLE_SECONDS,
+        poll_interval: float = settings.LEDGER_POLL_INTERVAL_SECONDS,
+        chunk_size: int = settings.LEDGER_REPLAY_CHUNK_SIZE,
+        session_factory=None,
+    ):
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        # Sync sessions for the restore thread; looked up when it runs by
+        # default, so tests can swap the engine.
+        self.session_factory = session_factory
+        self.wallets: Dict[int, WalletState] = {}
+        # Every event at or below the cursor has been folded in; newer ones
+        # are re-read on each catch-up until they settle.
+        self.cursor = 0
+        self._observed = deque()  # (monotonic time, newest id seen then)
+        self._polled_at: Optional[float] = None
+        # Balances recorded while a restore runs, applied once it is swapped in.
+        self._pending: Optional[list] = None
+        self._lock = asyncio.Lock()
+        self.events_applied = 0
+        self.wallets_seeded = 0
+
+    def __len__(self) -> int:
+        return len(self.wallets)
+
+    @property
+    def loaded(self) -> bool:
+        return self._polled_at is not None
+
+    def get(self, wallet_id: int) -> Optional[WalletState]:
+        return self.wallets.get(wallet_id)
+
+    def record(self, wallet_id: int, user_id: int, btc_balance_sats: int, usd_balance_cents: int, transaction_id: int):
+        """Sets a wallet's balances as committed with `transaction_id`, unless it already has newer ones.
+
+        Used with the balances a trade's UPDATE returned, which include every
+        earlier event of the wallet whether or not it has been replayed yet.
+        Does nothing before the ledger is loaded.
+        """
+        if self._pending is not None:
+            self._pending.append((wallet_id, user_id, btc_balance_sats, usd_balance_cents, transaction_id))
+        elif self.loaded:
+            self._put(wallet_id, user_id, btc_balance_sats, usd_balance_cents, transaction_id)
+
+    def _put(self, wallet_id: int, user_id: int, btc_balance_sats: int, usd_balance_cents: int, transaction_id: int):
+        state = self.wallets.get(wallet_id)
+        if state is None:
+            self.wallets[wallet_id] = WalletState(wallet_id, user_id, btc_balance_sats, usd_balance_cents, transaction_id)
+        elif transaction_id > state.last_transaction_id:
+            state.btc_balance_sats = btc_balance_sats
+            state.usd_balance_cents = usd_balance_cents
+            state.last_transaction_id = transaction_id
+
+    def replay(self, events: Iterable) -> tuple:
+        """Folds (id, wallet_id, transaction_type, btc_amount_sats, usd_amount_cents) events in id order.
+
+        Returns the newest id seen and the ids of wallets the ledger doesn't
+        know, whose events were skipped.
+        """
+        wallets = self.wallets
+        newest = 0
+        unknown = set()
+        applied = 0
+        for transaction_id, wallet_id, transaction_type, btc_amount_sats, usd_amount_cents in events:
+            newest = transaction_id
+            state = wallets.get(wallet_id)
+            if state is None:
+                unknown.add(wallet_id)
+            elif transaction_id > state.last_transaction_id:
+                if transaction_type == "buy":
+                    state.btc_balance_sats += btc_amount_sats
+                    state.usd_balance_cents -= usd_amount_cents
+                else:
+                    state.btc_balance_sats -= btc_amount_sats
+                    state.usd_balance_cents += usd_amount_cents
+                state.last_transaction_id = transaction_id
+                applied += 1
+        self.events_applied += applied
+        return newest, unknown
+
+    def _observe(self, newest: int):
+        now = time.monotonic()
+        self._observed.append((now, max(newest, self._observed[-1][1] if self._observed else self.cursor)))
+        while self._observed and now - self._observed[0][0] >= self.settle_seconds:
+            self.cursor = max(self.cursor, self._observed.popleft()[1])
+        self._polled_at = now
+
+    def seed(self, db: Session, wallet_ids: Iterable[int]):
+        """Loads wallets from their rows, as of their newest transaction."""
+        newest_transaction = newest_transaction_of_wallet()
+        for chunk in _chunks(list(wallet_ids)):
+            rows = db.execute(
+                select(
+                    wallets_table.c.id,
+                    wallets_table.c.user_id,
+                    wallets_table.c.btc_balance_sats,
+                    wallets_table.c.usd_balance_cents,
+                    newest_transaction,
+                ).where(wallets_table.c.id.in_(chunk))
+            )
+            for wallet_id, user_id, btc_balance_sats, usd_balance_cents, last_transaction_id in rows:
+                self._put(wallet_id, user_id, btc_balance_sats, usd_balance_cents, last_transaction_id or 0)
+                self.wallets_seeded += 1
+
+    def catch_up(self, db: Session):
+        """Replays the events appended since the cursor, seeding any wallets they reveal."""
+        result = db.execute(
+            select(
+                transactions_table.c.id,
+                transactions_table.c.wallet_id,
+                transactions_table.c.transaction_type,
+                transactions_table.c.btc_amount_sats,
+                transactions_table.c.usd_amount_cents,
+            )
+            .where(transactions_table.c.id > self.cursor)
+            .order_by(transactions_table.c.id)
+            .execution_options(yield_per=self.chunk_size)
+        )
+        newest = 0
+        unknown = set()
+        for chunk in result.partitions():
+            chunk_newest, chunk_unknown = self.replay(chunk)
+            newest = max(newest, chunk_newest)
+            unknown |= chunk_unknown
+        if unknown:
+            # A wallet row already holds all of the wallet's committed events.
+            self.seed(db, unknown)
+        self._observe(newest)
+
+    def restore(self, db: Session):
+        """Rebuilds the projection from the newest snapshot and the events after it."""
+        self.wallets.clear()
+        self._observed.clear()
+        snapshot = db.execute(
+            select(ledger_snapshots_table.c.id, ledger_snapshots_table.c.through_transaction_id)
+            .order_by(ledger_snapshots_table.c.id.desc())
+            .limit(1)
+        ).first()
+        if snapshot is None:
+            # No snapshot yet: start every wallet from its row, and re-read
+            # only the transactions recent enough to still be settling.
+            self.cursor = settled_transaction_id(db, self.settle_seconds)
+            self.seed(db, db.scalars(select(wallets_table.c.id)).all())
+        else:
+            self.cursor = snapshot.through_transaction_id
+            rows = db.execute(
+                select(
+                    wallet_snapshots_table.c.wallet_id,
+                    wallet_snapshots_table.c.user_id,
+                    wallet_snapshots_table.c.btc_balance_sats,
+                    wallet_snapshots_table.c.usd_balance_cents,
+                    wallet_snapshots_table.c.last_transaction_id,
+                )
+                .where(wallet_snapshots_table.c.snapshot_id == snapshot.id)
+                .execution_options(yield_per=self.chunk_size)
+            )
+            for row in rows:
+                self.wallets[row[0]] = WalletState(*row)
+        self.catch_up(db)
+
+    def _restore_with_new_session(self, session_factory):
+        with session_factory() as db:
+            self.restore(db)
+
+    async def load(self):
+        """Restores the projection in a worker thread, on its own sync session, and swaps it in.
+
+        A restore can replay a whole snapshot interval of events, or seed
+        every wallet, so it must not run on the event loop. Balances that
+        trades record meanwhile are applied on top of the result.
+        """
+        restored = WalletLedger(self.settle_seconds, self.poll_interval, self.chunk_size)
+        self._pending = []
+        try:
+            await asyncio.to_thread(restored._restore_with_new_session, self.session_factory or database.SessionLocal)
+            self.wallets = restored.wallets
+            self.cursor = restored.cursor
+            self._observed = restored._observed
+            self.events_applied += restored.events_applied
+            self.wallets_seeded += restored.wallets_seeded
+            for recorded in self._pending:
+                self._put(*recorded)
+            self._polled_at = restored._polled_at
+        finally:
+            self._pending = None
+
+    async def refresh(self, db):
+        """Loads the projection, or catches it up on an AsyncSession if a poll is due."""
+        if self.loaded and time.monotonic() - self._polled_at < self.poll_interval:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.load()
+            elif time.monotonic() - self._polled_at >= self.poll_interval:
+                await db.run_sync(self.catch_up)
+
+    async def read(self, db, wallet_id: int) -> Optional[WalletState]:
+        """A wallet's balances from memory, seeding it from its row the first time it is read."""
+        await self.refresh(db)
+        state = self.wallets.get(wallet_id)
+        if state is None:
+            await db.run_sync(self.seed, [wallet_id])
+            state = self.wallets.get(wallet_id)
+        return state
+
+    def clear(self):
+        self.wallets.clear()
+        self._observed.clear()
+        self.cursor = 0
+        self._polled_at = None
+
+    def metrics(self) -> dict:
+        return {
+            "wallets": len(self.wallets),
+            "cursor": self.cursor,
+            "events_applied": self.events_applied,
+            "wallets_seeded": self.wallets_seeded,
+        }
+
+
+wallet_ledger = WalletLedger()
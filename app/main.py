@@ -1,12 +1,28 @@
 from fastapi import FastAPI
-from . import models, database
-from .routers import trading, questions
+from . import models, database, api_client, cache, group_commit, ledger, search, security
+from .config import settings
+from .routers import trading, questions, metrics
 
 app = FastAPI()
 
 @app.on_event("startup")
-def on_startup():
-    models.Base.metadata.create_all(bind=database.engine)
+async def on_startup():
+    async with database.async_engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(search.ensure_search_index)
+    if settings.LEDGER_ENABLED:
+        # Restored before serving, so the first /wallet/ reads don't wait on it.
+        await ledger.wallet_ledger.load()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await api_client.price_feed.aclose()
+    api_client.price_feed.close()
+    await cache.question_cache.aclose()
+    await group_commit.trade_committer.aclose()
+    await database.async_engine.dispose()
+    security.password_hasher.shutdown()
 
 app.include_router(trading.router)
 app.include_router(questions.router)
+app.include_router(metrics.router)
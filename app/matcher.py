@@ -0,0 +1,205 @@
+from collections import namedtuple
+from typing import Dict, List
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .money import cost_cents, proceeds_cents
+from .order_book import BookOrder, OrderBook
+
+try:
+    from . import matching_kernel
+except ImportError:  # numpy is optional; the pure Python matcher always works
+    matching_kernel = None
+
+Fill = namedtuple("Fill", ["order_id", "wallet_id", "transaction_type", "btc_amount_sats", "usd_amount_cents"])
+
+IN_CLAUSE_CHUNK = 5000
+
+# Below this many crossed orders, building the kernel's arrays costs more
+# than the Python loop it replaces.
+VECTORIZE_MIN_ORDERS = 1000
+
+wallets_table = models.Wallet.__table__
+orders_table = models.Order.__table__
+
+# Keyed by wallet id and run as executemany, so a whole tick's fills are
+# applied with one statement however many wallets they touch. The guard
+# never lets a balance go negative.
+apply_wallet_deltas = (
+    wallets_table.update()
+    .where(
+        wallets_table.c.id == bindparam("b_wallet_id"),
+        wallets_table.c.btc_balance_sats + bindparam("b_btc_delta") >= 0,
+        wallets_table.c.usd_balance_cents + bindparam("b_usd_delta") >= 0,
+    )
+    .values(
+        btc_balance_sats=wallets_table.c.btc_balance_sats + bindparam("b_btc_delta"),
+        usd_balance_cents=wallets_table.c.usd_balance_cents + bindparam("b_usd_delta"),
+    )
+)
+
+
+class BalanceConflict(Exception):
+    """Raised when a wallet's balance changed under a tick's fills and can no longer cover them."""
+
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def compute_fills(candidates: List[BookOrder], balances: Dict[int, list]) -> List[Fill]:
+    """Decides which crossed orders fill, in the order given.
+
+    `balances` maps wallet id to a mutable `[btc_balance_sats,
+    usd_balance_cents]` pair and is drawn down as orders fill, so several
+    orders from one wallet can't spend the same funds. An order the wallet
+    can't cover is skipped and stays on the book. Fills are priced at the
+    order's limit, with buys rounded up and sells down to the cent.
+    """
+    fills = []
+    for order in candidates:
+        balance = balances.get(order.wallet_id)
+        if balance is None:
+            continue
+        if order.order_type == "buy":
+            usd_amount_cents = cost_cents(order.btc_amount_sats, order.price_cents)
+            if balance[1] >= usd_amount_cents:
+                balance[1] -= usd_amount_cents
+                balance[0] += order.btc_amount_sats
+                fills.append(Fill(order.id, order.wallet_id, "buy", order.btc_amount_sats, usd_amount_cents))
+        elif order.order_type == "sell":
+            usd_amount_cents = proceeds_cents(order.btc_amount_sats, order.price_cents)
+            if balance[0] >= order.btc_amount_sats:
+                balance[0] -= order.btc_amount_sats
+                balance[1] += usd_amount_cents
+                fills.append(Fill(order.id, order.wallet_id, "sell", order.btc_amount_sats, usd_amount_cents))
+    return fills
+
+
+def apply_fills(db: Session, fills: List[Fill]) -> List[Fill]:
+    """Writes `fills` in bulk and returns the ones written; the caller commits.
+
+    Each fill's order is deactivated only if it is still active, and a fill
+    whose order was cancelled in the meantime is dropped. The touched
+    wallets are then re-read, and if any of them can no longer cover its
+    fills BalanceConflict is raised and the caller must roll back. Once the
+    orders are deactivated the transaction holds the write locks, so the
+    balances can't change again before the deltas are applied.
+    """
+    if not fills:
+        return []
+    deactivated = set()
+    for chunk in _chunks([fill.order_id for fill in fills]):
+        deactivated.update(db.scalars(
+            update(orders_table)
+            .where(orders_table.c.id.in_(chunk), orders_table.c.is_active == True)
+            .values(is_active=False)
+            .returning(orders_table.c.id)
+        ))
+    fills = [fill for fill in fills if fill.order_id in deactivated]
+    if not fills:
+        return []
+
+    deltas = {}
+    for fill in fills:
+        delta = deltas.setdefault(fill.wallet_id, [0, 0])
+        if fill.transaction_type == "buy":
+            delta[0] += fill.btc_amount_sats
+            delta[1] -= fill.usd_amount_cents
+        else:
+            delta[0] -= fill.btc_amount_sats
+            delta[1] += fill.usd_amount_cents
+    balances = load_balances(db, deltas)
+    for wallet_id, (btc_delta, usd_delta) in deltas.items():
+        balance = balances.get(wallet_id)
+        if balance is None or balance[0] + btc_delta < 0 or balance[1] + usd_delta < 0:
+            raise BalanceConflict(f"wallet {wallet_id} can no longer cover its fills")
+
+    db.execute(
+        apply_wallet_deltas,
+        [
+            {"b_wallet_id": wallet_id, "b_btc_delta": btc_delta, "b_usd_delta": usd_delta}
+            for wallet_id, (btc_delta, usd_delta) in deltas.items()
+        ],
+    )
+    db.execute(
+        insert(models.Transaction),
+        [
+            {
+                "wallet_id": fill.wallet_id,
+                "transaction_type": fill.transaction_type,
+                "btc_amount_sats": fill.btc_amount_sats,
+                "usd_amount_cents": fill.usd_amount_cents,
+                "order_id": fill.order_id,
+            }
+            for fill in fills
+        ],
+    )
+    return fills
+
+
+def load_balances(db: Session, wallet_ids) -> Dict[int, list]:
+    """Reads the wallets' balances and locks them (FOR UPDATE, in id order) until the caller commits."""
+    balances = {}
+    for chunk in _chunks(sorted(wallet_ids)):
+        rows = db.execute(
+            select(models.Wallet.id, models.Wallet.btc_balance_sats, models.Wallet.usd_balance_cents)
+            .where(models.Wallet.id.in_(chunk))
+            .order_by(models.Wallet.id)
+            .with_for_update()
+        )
+        for wallet_id, btc_balance_sats, usd_balance_cents in rows:
+            balances[wallet_id] = [btc_balance_sats, usd_balance_cents]
+    return balances
+
+
+def match_book(db: Session, book: OrderBook, current_price_cents: int) -> List[Fill]:
+    """Fills the resting orders in `book` crossed by `current_price_cents`.
+
+    Only the crossed price levels are visited. Their orders are re-checked
+    against the database and their wallets loaded with one query per chunk
+    of ids, both locked until the commit so that a concurrent cancel or
+    trade waits for the fills, and the resulting fills are written in bulk.
+    If a wallet changed under the fills anyway (SQLite takes no row locks)
+    the tick is rolled back and nothing fills until the next one.
+    """
+    candidates = book.crossed(current_price_cents)
+    if not candidates:
+        return []
+
+    candidate_ids = [order.id for order in candidates]
+    active = set()
+    for chunk in _chunks(candidate_ids):
+        active.update(db.scalars(
+            select(models.Order.id)
+            .where(models.Order.id.in_(chunk), models.Order.is_active == True)
+            .order_by(models.Order.id)
+            .with_for_update()
+        ))
+    for order_id in candidate_ids:
+        if order_id not in active:
+            book.discard(order_id)  # cancelled since it was added to the book
+    candidates = [order for order in candidates if order.id in active]
+
+    balances = load_balances(db, {order.wallet_id for order in candidates})
+    fills = None
+    if matching_kernel is not None and len(candidates) >= VECTORIZE_MIN_ORDERS:
+        try:
+            fills = matching_kernel.compute_fills(candidates, balances)
+        except OverflowError:
+            pass  # amounts too large for int64; the Python loop has no limit
+    if fills is None:
+        fills = compute_fills(candidates, balances)
+    try:
+        fills = apply_fills(db, fills)
+    except BalanceConflict:
+        db.rollback()
+        return []
+    db.commit()
+
+    for fill in fills:
+        book.discard(fill.order_id)
+    return fills
@@ -0,0 +1,242 @@
+"""Array-backed matching kernel.
+
+Orders and balances are held in contiguous int64 arrays, and a matching pass
+is a handful of whole-array operations instead of a Python loop per order:
+
+1. The crossing test is one vectorized comparison against the price.
+2. Each wallet's spend is summed per wallet with `np.add.at` and compared
+   with its balance. Buys are checked against USD. Sells are checked
+   against BTC plus what the wallet's buys just bought, since every bid is
+   matched before any ask. Amounts are positive, so a wallet whose total
+   fits covers every running total along the way, whatever the priority
+   order, and no sort is needed.
+
+This gives exactly the fills of `matcher.compute_fills` for every wallet that
+can cover all of its crossed orders. A wallet that runs out part way is
+handed to the same greedy loop as the Python matcher, in matching priority,
+because skipping an order it can't cover and filling a later, smaller one is
+inherently sequential. Only that wallet's orders are sorted and take the
+slow path, and in practice there are few of them.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .money import SATS_PER_BTC
+
+if TYPE_CHECKING:
+    from .matcher import Fill
+
+INT64_MAX = np.iinfo(np.int64).max
+# Balances use a direct id -> index table while the largest wallet id is at
+# most this many times the number of wallets.
+DENSE_LOOKUP_FACTOR = 4
+
+
+@dataclass
+class OrderArrays:
+    id: np.ndarray
+    wallet_id: np.ndarray
+    is_buy: np.ndarray
+    btc_amount_sats: np.ndarray
+    price_cents: np.ndarray
+
+    def __len__(self):
+        return len(self.id)
+
+    def take(self, positions: np.ndarray) -> "OrderArrays":
+        return OrderArrays(
+            self.id[positions],
+            self.wallet_id[positions],
+            self.is_buy[positions],
+            self.btc_amount_sats[positions],
+            self.price_cents[positions],
+        )
+
+    @classmethod
+    def from_rows(cls, rows) -> "OrderArrays":
+        """Builds the arrays from (id, wallet_id, order_type, btc_amount_sats, price_cents) rows."""
+        rows = list(rows)
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, np.empty(0, dtype=bool), empty, empty)
+        ids, wallet_ids, order_types, amounts, prices = zip(*rows)
+        return cls(
+            np.fromiter(ids, dtype=np.int64, count=len(rows)),
+            np.fromiter(wallet_ids, dtype=np.int64, count=len(rows)),
+            np.fromiter((order_type == "buy" for order_type in order_types), dtype=bool, count=len(rows)),
+            np.fromiter(amounts, dtype=np.int64, count=len(rows)),
+            np.fromiter(prices, dtype=np.int64, count=len(rows)),
+        )
+
+    @classmethod
+    def load(cls, db: Session) -> "OrderArrays":
+        """Every active buy and sell order in the database."""
+        rows = db.execute(
+            select(
+                models.Order.id,
+                models.Order.wallet_id,
+                models.Order.order_type,
+                models.Order.btc_amount_sats,
+                models.Order.price_cents,
+            ).where(models.Order.is_active == True, models.Order.order_type.in_(("buy", "sell")))
+        )
+        return cls.from_rows(rows)
+
+
+@dataclass
+class BalanceArrays:
+    wallet_id: np.ndarray  # sorted, for searchsorted lookups
+    btc_balance_sats: np.ndarray
+    usd_balance_cents: np.ndarray
+
+    @classmethod
+    def from_dict(cls, balances: Dict[int, list]) -> "BalanceArrays":
+        """Builds the arrays from `matcher.load_balances` output."""
+        wallet_ids = np.fromiter(balances, dtype=np.int64, count=len(balances))
+        order = np.argsort(wallet_ids)
+        btc = np.fromiter((balance[0] for balance in balances.values()), dtype=np.int64, count=len(balances))
+        usd = np.fromiter((balance[1] for balance in balances.values()), dtype=np.int64, count=len(balances))
+        return cls(wallet_ids[order], btc[order], usd[order])
+
+    def lookup(self, wallet_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns each wallet's index into these arrays and whether it was found."""
+        count = len(self.wallet_id)
+        if count == 0:
+            return np.zeros(len(wallet_ids), dtype=np.int64), np.zeros(len(wallet_ids), dtype=bool)
+        low, high = int(self.wallet_id[0]), int(self.wallet_id[-1])
+        if low >= 0 and high <= DENSE_LOOKUP_FACTOR * count:
+            # Wallet ids come from a sequence, so a direct table is small and
+            # a gather is much cheaper than a binary search per order.
+            table = np.full(high + 1, -1, dtype=np.int64)
+            table[self.wallet_id] = np.arange(count)
+            in_range = (wallet_ids >= 0) & (wallet_ids <= high)
+            index = table[np.where(in_range, wallet_ids, 0)]
+            found = in_range & (index >= 0)
+            return np.maximum(index, 0), found
+        index = np.minimum(np.searchsorted(self.wallet_id, wallet_ids), count - 1)
+        return index, self.wallet_id[index] == wallet_ids
+
+
+def crossed(orders: OrderArrays, price_cents: int) -> np.ndarray:
+    """Mask of the orders crossed by `price_cents`: bids at or above it, asks at or below it."""
+    return np.where(orders.is_buy, orders.price_cents >= price_cents, orders.price_cents <= price_cents)
+
+
+def in_priority(orders: OrderArrays) -> np.ndarray:
+    """Positions of `orders` in matching priority: bids before asks, best price first, then id."""
+    return np.lexsort((orders.id, np.where(orders.is_buy, -orders.price_cents, orders.price_cents), ~orders.is_buy))
+
+
+def crossed_in_priority(orders: OrderArrays, price_cents: int) -> np.ndarray:
+    """Positions of the orders crossed by `price_cents`, in matching priority."""
+    positions = np.flatnonzero(crossed(orders, price_cents))
+    return positions[in_priority(orders.take(positions))]
+
+
+def _exact_fills(orders: OrderArrays, positions: np.ndarray, btc: int, usd: int, usd_amounts: np.ndarray, filled: np.ndarray):
+    # The Python matcher's greedy loop, for one wallet's orders in priority order.
+    for position in positions:
+        sats = int(orders.btc_amount_sats[position])
+        amount = int(usd_amounts[position])
+        if orders.is_buy[position]:
+            if usd >= amount:
+                usd -= amount
+                btc += sats
+                filled[position] = True
+        elif btc >= sats:
+            btc -= sats
+            usd += amount
+            filled[position] = True
+
+
+def fill_orders(orders: OrderArrays, balances: BalanceArrays) -> Tuple[np.ndarray, np.ndarray]:
+    """Decides which of `orders`, all crossed, fill, exactly as `matcher.compute_fills` would.
+
+    The orders may be in any order. Returns a mask of the filled orders and
+    every order's USD amount in cents: its limit cost for a buy, rounded up,
+    and its limit proceeds for a sell, rounded down. Raises OverflowError if
+    an amount times its price doesn't fit in 64 bits.
+    """
+    count = len(orders)
+    filled = np.zeros(count, dtype=bool)
+    usd_amounts = np.zeros(count, dtype=np.int64)
+    if count == 0:
+        return filled, usd_amounts
+    if int(orders.btc_amount_sats.max()) > INT64_MAX // max(int(orders.price_cents.max()), 1):
+        raise OverflowError("order notional exceeds 64 bits")
+
+    notional = orders.btc_amount_sats * orders.price_cents
+    usd_amounts = np.where(orders.is_buy, -(-notional // SATS_PER_BTC), notional // SATS_PER_BTC)
+
+    index, found = balances.lookup(orders.wallet_id)
+    buys = orders.is_buy & found
+    sells = ~orders.is_buy & found
+
+    # Per-wallet totals. Every bid matches before any ask, so a wallet covers
+    # all of its orders when its bids total within its USD and its asks
+    # within its BTC plus what the bids bought.
+    wallet_count = len(balances.wallet_id)
+    spent = np.zeros(wallet_count, dtype=np.int64)
+    np.add.at(spent, index[buys], usd_amounts[buys])
+    bought = np.zeros(wallet_count, dtype=np.int64)
+    np.add.at(bought, index[buys], orders.btc_amount_sats[buys])
+    sold = np.zeros(wallet_count, dtype=np.int64)
+    np.add.at(sold, index[sells], orders.btc_amount_sats[sells])
+    covered = (spent <= balances.usd_balance_cents) & (sold <= balances.btc_balance_sats + bought)
+
+    filled = found & covered[index]
+    positions = np.flatnonzero(found & ~filled)
+    if len(positions):
+        # The rest belong to wallets that run short part way. Put them in
+        # priority order, then a stable sort by wallet keeps that order
+        # within each wallet for the greedy loop.
+        positions = positions[in_priority(orders.take(positions))]
+        by_wallet = positions[np.argsort(orders.wallet_id[positions], kind="stable")]
+        for group in np.split(by_wallet, np.flatnonzero(np.diff(orders.wallet_id[by_wallet])) + 1):
+            i = index[group[0]]
+            _exact_fills(orders, group, int(balances.btc_balance_sats[i]), int(balances.usd_balance_cents[i]), usd_amounts, filled)
+    return filled, usd_amounts
+
+
+def match(orders: OrderArrays, balances: BalanceArrays, price_cents: int) -> Tuple[OrderArrays, np.ndarray]:
+    """Matches every order in `orders` against `price_cents`.
+
+    Returns the filled orders, in the order given, and their USD amounts in
+    cents. Use `in_priority` on the result for matching priority.
+    """
+    candidates = orders.take(np.flatnonzero(crossed(orders, price_cents)))
+    filled, usd_amounts = fill_orders(candidates, balances)
+    return candidates.take(filled), usd_amounts[filled]
+
+
+def compute_fills(candidates, balances: Dict[int, list]) -> List["Fill"]:
+    """Drop-in replacement for `matcher.compute_fills` backed by the kernel.
+
+    Takes crossed buy and sell `BookOrder`s in priority order and leaves
+    `balances` as the Python version would: drawn down by the fills.
+    """
+    from .matcher import Fill
+
+    orders = OrderArrays.from_rows(
+        (order.id, order.wallet_id, order.order_type, order.btc_amount_sats, order.price_cents) for order in candidates
+    )
+    filled, usd_amounts = fill_orders(orders, BalanceArrays.from_dict(balances))
+
+    fills = []
+    for position in np.flatnonzero(filled):
+        order = candidates[position]
+        usd_amount_cents = int(usd_amounts[position])
+        balance = balances[order.wallet_id]
+        if order.order_type == "buy":
+            balance[0] += order.btc_amount_sats
+            balance[1] -= usd_amount_cents
+        else:
+            balance[0] -= order.btc_amount_sats
+            balance[1] += usd_amount_cents
+        fills.append(Fill(order.id, order.wallet_id, order.order_type, order.btc_amount_sats, usd_amount_cents))
+    return fills
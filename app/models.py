@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import create_engine, BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, func, literal_column
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.orm import sessionmaker
 from pydantic import BaseModel
 import datetime
 
+from .money import CENTS_PER_USD, SATS_PER_BTC, unit_property
+
 Base = declarative_base()
 
 class User(Base):
@@ -19,9 +21,12 @@ class Wallet(Base):
     __tablename__ = "wallets"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    btc_balance = Column(Float, default=0.0)
-    usd_balance = Column(Float, default=100000.0)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    btc_balance_sats = Column(BigInteger, default=0)
+    usd_balance_cents = Column(BigInteger, default=100000 * CENTS_PER_USD)
+
+    btc_balance = unit_property("btc_balance_sats", SATS_PER_BTC)
+    usd_balance = unit_property("usd_balance_cents", CENTS_PER_USD)
 
     owner = relationship("User", back_populates="wallets")
     transactions = relationship("Transaction", back_populates="wallet")
@@ -32,28 +37,106 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True, index=True)
     wallet_id = Column(Integer, ForeignKey("wallets.id"))
     transaction_type = Column(String)
-    btc_amount = Column(Float)
-    usd_amount = Column(Float)
+    btc_amount_sats = Column(BigInteger)
+    usd_amount_cents = Column(BigInteger)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    # Set when the transaction is the fill of a resting order.
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
 
     wallet = relationship("Wallet", back_populates="transactions")
 
+    btc_amount = unit_property("btc_amount_sats", SATS_PER_BTC)
+    usd_amount = unit_property("usd_amount_cents", CENTS_PER_USD)
+
+    __table_args__ = (
+        Index("ix_transactions_wallet_id_timestamp", "wallet_id", "timestamp"),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    wallet_id = Column(Integer, ForeignKey("wallets.id"))
+    wallet_id = Column(Integer, ForeignKey("wallets.id"), index=True)
     order_type = Column(String)  # "buy" or "sell"
-    btc_amount = Column(Float)
-    price_usd = Column(Float)
+    btc_amount_sats = Column(BigInteger)
+    price_cents = Column(BigInteger)  # limit price per whole BTC
     is_active = Column(Boolean, default=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
+    btc_amount = unit_property("btc_amount_sats", SATS_PER_BTC)
+    price_usd = unit_property("price_cents", CENTS_PER_USD)
+
+    __table_args__ = (
+        # Only resting orders are ever matched, and they are a small slice of the table.
+        Index(
+            "ix_orders_active_type_price",
+            "order_type",
+            "price_cents",
+            postgresql_where=(is_active == True),
+            sqlite_where=(is_active == True),
+        ),
+    )
+
+class LedgerSnapshot(Base):
+    """A compacted copy of every wallet's balance, folded from the transactions up to a point."""
+    __tablename__ = "ledger_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    # Replay resumes after this transaction id.
+    through_transaction_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class WalletSnapshot(Base):
+    __tablename__ = "wallet_snapshots"
+
+    snapshot_id = Column(Integer, ForeignKey("ledger_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    wallet_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    btc_balance_sats = Column(BigInteger)
+    usd_balance_cents = Column(BigInteger)
+    # The wallet's newest transaction folded into the balances.
+    last_transaction_id = Column(Integer)
+
+def question_search_vector(question, answer):
+    """The Postgres full-text document of a question: its question and answer text.
+
+    Everything is rendered inline so that queries repeat the index expression
+    exactly and the planner can use the index.
+    """
+    return func.to_tsvector(
+        literal_column("'simple'"),
+        func.coalesce(question, literal_column("''")).op("||")(literal_column("' '")).op("||")(func.coalesce(answer, literal_column("''"))),
+    )
+
 class Question(Base):
     __tablename__ = "questions"
 
     id = Column(Integer, primary_key=True, index=True)
     question = Column(String, index=True)
     answer = Column(Text)
-    topic = Column(String, index=True)
+    topic = Column(String)
     difficulty = Column(String)
+    # Set on questions indexed from learning-materials/: the markdown file
+    # (relative to the corpus root) and the question's key within it.
+    source_path = Column(String, nullable=True)
+    source_key = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_questions_source", "source_path", "source_key", unique=True),
+        # Serve the id-ordered pages of GET /questions/ without a sort, one
+        # index per combination of filters; (topic, id) also serves plain
+        # topic lookups.
+        Index("ix_questions_topic_difficulty_id", "topic", "difficulty", "id"),
+        Index("ix_questions_topic_id", "topic", "id"),
+        Index("ix_questions_difficulty_id", "difficulty", "id"),
+        Index("ix_questions_search", question_search_vector(question, answer), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+class SourceFile(Base):
+    """Fingerprint of an indexed learning-materials file, to skip it when unchanged."""
+    __tablename__ = "source_files"
+
+    path = Column(String, primary_key=True)
+    size = Column(Integer)
+    mtime_ns = Column(BigInteger)
+    sha256 = Column(String)
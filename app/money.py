@@ -0,0 +1,62 @@
+"""Fixed-point money.
+
+Balances and amounts are stored and computed as integers: BTC in satoshis
+and USD in cents, with prices in cents per whole BTC. Comparisons and sums
+are exact, so a balance check never passes or fails on a rounding error.
+Floats only appear at the API edge, where they are converted with
+`btc_to_sats` and `usd_to_cents`, and the models expose float views of the
+integer columns for the response schemas.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Optional
+
+SATS_PER_BTC = 100_000_000
+CENTS_PER_USD = 100
+
+
+def to_units(amount: float, scale: int) -> int:
+    """Converts `amount` to the nearest whole unit of 1/`scale`, rounding ties to even.
+
+    Goes through the float's shortest decimal repr, so 0.1 BTC is exactly
+    10_000_000 sats rather than whatever 0.1 * 1e8 happens to round to.
+    """
+    return int((Decimal(repr(float(amount))) * scale).to_integral_value(ROUND_HALF_EVEN))
+
+
+def btc_to_sats(btc: float) -> int:
+    return to_units(btc, SATS_PER_BTC)
+
+
+def usd_to_cents(usd: float) -> int:
+    return to_units(usd, CENTS_PER_USD)
+
+
+def sats_to_btc(sats: int) -> float:
+    return sats / SATS_PER_BTC
+
+
+def cents_to_usd(cents: int) -> float:
+    return cents / CENTS_PER_USD
+
+
+def cost_cents(sats: int, price_cents: int) -> int:
+    """What buying `sats` at `price_cents` per BTC costs, rounded up to the cent."""
+    return -(-sats * price_cents // SATS_PER_BTC)
+
+
+def proceeds_cents(sats: int, price_cents: int) -> int:
+    """What selling `sats` at `price_cents` per BTC pays, rounded down to the cent."""
+    return sats * price_cents // SATS_PER_BTC
+
+
+def unit_property(attribute: str, scale: int) -> property:
+    """A float view, in whole units, of the integer attribute `attribute` held in 1/`scale` units."""
+
+    def get(self) -> Optional[float]:
+        value = getattr(self, attribute)
+        return None if value is None else value / scale
+
+    def set(self, value: Optional[float]):
+        setattr(self, attribute, None if value is None else to_units(value, scale))
+
+    return property(get, set)
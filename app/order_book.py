@@ -0,0 +1,171 @@
+import bisect
+import datetime
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+@dataclass
+class BookOrder:
+    id: int
+    wallet_id: int
+    order_type: str
+    btc_amount_sats: int
+    price_cents: int
+
+
+class BookSide:
+    """One side of the book: resting orders grouped into price levels.
+
+    Prices are kept in an ascending list so the levels crossed by a given
+    price can be found with a bisect; each level keeps its orders in arrival
+    order, which gives time priority inside a level.
+    """
+
+    def __init__(self):
+        self._prices: List[int] = []
+        self._levels: Dict[int, Dict[int, BookOrder]] = {}
+
+    def __len__(self):
+        return sum(len(level) for level in self._levels.values())
+
+    def add(self, order: BookOrder):
+        level = self._levels.get(order.price_cents)
+        if level is None:
+            level = self._levels[order.price_cents] = {}
+            bisect.insort(self._prices, order.price_cents)
+        level[order.id] = order
+
+    def remove(self, order: BookOrder):
+        level = self._levels.get(order.price_cents)
+        if level is None or level.pop(order.id, None) is None:
+            return
+        if not level:
+            del self._levels[order.price_cents]
+            del self._prices[bisect.bisect_left(self._prices, order.price_cents)]
+
+    def at_or_above(self, price: int) -> List[BookOrder]:
+        """Orders priced at or above `price`, best (highest) level first."""
+        start = bisect.bisect_left(self._prices, price)
+        crossed = []
+        for level_price in reversed(self._prices[start:]):
+            crossed.extend(self._levels[level_price].values())
+        return crossed
+
+    def at_or_below(self, price: int) -> List[BookOrder]:
+        """Orders priced at or below `price`, best (lowest) level first."""
+        end = bisect.bisect_right(self._prices, price)
+        crossed = []
+        for level_price in self._prices[:end]:
+            crossed.extend(self._levels[level_price].values())
+        return crossed
+
+
+class OrderBook:
+    """In-memory view of the active limit orders in the `orders` table.
+
+    The `orders` table stays the source of truth: the book is rebuilt from it
+    with `load` and picks up orders placed since with `sync`. Order ids don't
+    commit in id order, so `sync` reads every row above the highest id seen
+    `settle_seconds` ago rather than the highest id seen so far, and skips
+    the orders the book already holds. Cancellations are not pushed to the
+    book, so callers must re-check `is_active` on the crossed orders before
+    filling them and `discard` the ones that are gone.
+
+    With `shard_count` > 1 the book only holds the orders of wallets where
+    `wallet_id % shard_count == shard`.
+    """
+
+    def __init__(self, shard: int = 0, shard_count: int = 1, settle_seconds: float = settings.ORDER_BOOK_SETTLE_SECONDS):
+        self.shard = shard
+        self.shard_count = shard_count
+        self.settle_seconds = settle_seconds
+        self.bids = BookSide()
+        self.asks = BookSide()
+        self._orders: Dict[int, BookOrder] = {}
+        self.high_water_id = 0
+        # Every order at or below this id had committed by the last sync.
+        self.settled_id = 0
+        self._observed = deque()  # (monotonic time, high-water id then)
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: int):
+        return order_id in self._orders
+
+    def _side(self, order_type: str):
+        if order_type == "buy":
+            return self.bids
+        if order_type == "sell":
+            return self.asks
+        return None
+
+    def add(self, order: BookOrder):
+        side = self._side(order.order_type)
+        if side is None or order.id in self._orders:
+            return
+        side.add(order)
+        self._orders[order.id] = order
+        self.high_water_id = max(self.high_water_id, order.id)
+
+    def discard(self, order_id: int):
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            self._side(order.order_type).remove(order)
+
+    def crossed(self, price: int) -> List[BookOrder]:
+        """Orders that would fill at `price` (in cents), in matching priority.
+
+        A buy crosses when the price is at or below its limit and a sell when
+        the price is at or above it, so only the levels on the far side of
+        `price` are visited.
+        """
+        return self.bids.at_or_above(price) + self.asks.at_or_below(price)
+
+    def load(self, db: Session):
+        """Rebuild the book from every active order in the database."""
+        self.bids = BookSide()
+        self.asks = BookSide()
+        self._orders = {}
+        self.high_water_id = 0
+        self._observed.clear()
+        self._add_rows(db, 0)
+        settled_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.settle_seconds)
+        self.settled_id = db.query(func.max(models.Order.id)).filter(models.Order.timestamp < settled_before).scalar() or 0
+        self._observe()
+
+    def sync(self, db: Session):
+        """Add active orders placed since the last `load` or `sync`, including late commits."""
+        self._add_rows(db, self.settled_id)
+        self._observe()
+
+    def _observe(self):
+        now = time.monotonic()
+        self._observed.append((now, self.high_water_id))
+        while self._observed and now - self._observed[0][0] >= self.settle_seconds:
+            self.settled_id = max(self.settled_id, self._observed.popleft()[1])
+
+    def _add_rows(self, db: Session, after_id: int):
+        query = (
+            db.query(
+                models.Order.id,
+                models.Order.wallet_id,
+                models.Order.order_type,
+                models.Order.btc_amount_sats,
+                models.Order.price_cents,
+            )
+            .filter(models.Order.is_active == True, models.Order.id > after_id)
+            .order_by(models.Order.id)
+        )
+        if self.shard_count > 1:
+            query = query.filter(models.Order.wallet_id % self.shard_count == self.shard)
+        for row in query:
+            self.add(BookOrder(*row))
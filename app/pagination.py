@@ -0,0 +1,50 @@
+import base64
+import datetime
+import json
+
+CURSOR_HEADER = "X-Next-Cursor"
+
+# Cursor ids are compared with INTEGER columns, so larger ones can't be bound.
+MAX_ID = 2**31 - 1
+
+class InvalidCursor(ValueError):
+    pass
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.datetime.fromisoformat(value["dt"])
+    return value
+
+def encode_cursor(*values) -> str:
+    """Packs the sort key of the last row on a page into an opaque cursor."""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _check_type(value, expected: type):
+    if expected is int:
+        # bool is an int subclass, but never an id.
+        return type(value) is int and -MAX_ID - 1 <= value <= MAX_ID
+    return isinstance(value, expected)
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """Unpacks a cursor made by `encode_cursor` whose values have `types` (int or datetime).
+
+    Raises InvalidCursor for anything else, so a crafted cursor is a 400
+    rather than a database error.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(value) for value in json.loads(raw)]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(str(e)) from e
+    if len(values) != len(types):
+        raise InvalidCursor(f"expected {len(types)} cursor values, got {len(values)}")
+    for value, expected in zip(values, types):
+        if not _check_type(value, expected):
+            raise InvalidCursor(f"expected {expected.__name__} in cursor, got {value!r}")
+    return values
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import List
+
+from . import api_client, database, worker
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PriceTicker:
+    """Polls a price feed and pushes price ticks to its subscribers.
+
+    A tick is published when the price moves, and re-published every
+    `heartbeat` seconds so orders placed at an already crossed limit still
+    get filled in a flat market. Stale and fallback quotes are never
+    published. Subscriber queues hold only the latest tick: a consumer that
+    falls behind skips straight to the newest price instead of working
+    through a backlog.
+    """
+
+    def __init__(
+        self,
+        feed: api_client.PriceFeed,
+        poll_interval: float = settings.PRICE_POLL_INTERVAL_SECONDS,
+        heartbeat: float = settings.PRICE_TICK_HEARTBEAT_SECONDS,
+    ):
+        self.feed = feed
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._subscribers: List[asyncio.Queue] = []
+        self._last_price = None
+        self._last_published = 0.0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.append(queue)
+        return queue
+
+    def publish(self, price: float):
+        self._last_price = price
+        self._last_published = time.monotonic()
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(price)
+
+    async def poll_once(self):
+        quote = await self.feed.get_quote()
+        if quote.source == "fallback" or quote.is_stale:
+            return
+        due = time.monotonic() - self._last_published >= self.heartbeat
+        if quote.price != self._last_price or due:
+            self.publish(quote.price)
+
+    async def run(self):
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.poll_interval)
+
+
+def _match_tick(price: float) -> int:
+    if settings.MATCHER_SHARDS > 1:
+        # The shards report their fills to collect_fill_stats instead.
+        worker.dispatch_price(price)
+        return 0
+    db = database.SessionLocal()
+    try:
+        return worker.match_orders(db, price)
+    finally:
+        db.close()
+
+
+async def run_matcher(queue: asyncio.Queue, min_interval: float = settings.MATCH_MIN_INTERVAL_SECONDS):
+    """Runs the order matcher on every tick from `queue`, at most once per `min_interval`.
+
+    A tick that fails is logged and skipped; matching carries on with the
+    next one.
+    """
+    last_run = float("-inf")
+    while True:
+        price = await queue.get()
+        wait = min_interval - (time.monotonic() - last_run)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            if not queue.empty():
+                price = queue.get_nowait()
+        last_run = time.monotonic()
+        try:
+            fills = await asyncio.to_thread(_match_tick, price)
+        except Exception:
+            logger.exception("Matching at %s failed", price)
+            continue
+        if fills:
+            logger.info("Filled %s orders at %s", fills, price)
+
+
+async def main():
+    # The ticker needs every poll to reach CoinGecko, so it does not share the
+    # API's cached feed.
+    feed = api_client.PriceFeed(ttl=settings.PRICE_POLL_INTERVAL_SECONDS)
+    ticker = PriceTicker(feed)
+    queue = ticker.subscribe()
+    try:
+        await asyncio.gather(ticker.run(), run_matcher(queue))
+    finally:
+        await feed.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from .. import cache, group_commit, ledger, security
+from ..config import settings
+
+router = APIRouter()
+
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    """Lets through only requests bearing METRICS_TOKEN; without one set, /metrics is off."""
+    if settings.METRICS_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if authorization is None or not hmac.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+def read_metrics():
+    """Counters for tuning the app's bounded pools and caches."""
+    return {
+        "password_hasher": security.password_hasher.metrics(),
+        "question_cache": cache.question_cache.metrics(),
+        "wallet_ledger": ledger.wallet_ledger.metrics(),
+        "group_commit": group_commit.trade_committer.metrics(),
+    }
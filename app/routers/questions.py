@@ -1,50 +1,232 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import json
 
-from .. import models, database, schemas
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from .. import models, database, schemas, search, pagination, bulk
+from ..cache import CachedResponse, etag_matches, question_cache
+from ..sampling import question_sampler
+from ..config import settings
 
 router = APIRouter()
 
+QUESTION_JSON = TypeAdapter(schemas.Question)
+QUESTION_LIST_JSON = TypeAdapter(List[schemas.Question])
+
+# Every cached list page is in this group, since any write can change any page.
+LIST_PAGES = "lists"
+
+def question_key(question_id: int) -> str:
+    return f"question:{question_id}"
+
+def cached_response(cached: CachedResponse, if_none_match: Optional[str]) -> Response:
+    if etag_matches(if_none_match, cached.etag):
+        question_cache.not_modified += 1
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(cached.body, media_type="application/json", headers=cached.headers)
+
+async def read_batch(request: Request) -> list:
+    """Reads a bulk request body: a JSON array, or NDJSON with one item per line.
+
+    An NDJSON line that isn't valid JSON becomes a ValueError in its place,
+    so it is reported against its own item rather than failing the batch.
+    A body over QUESTION_BULK_MAX_BYTES is refused with 413 before it is
+    read in full.
+    """
+    too_large = HTTPException(
+        status_code=413, detail=f"Body must be at most {settings.QUESTION_BULK_MAX_BYTES} bytes"
+    )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.QUESTION_BULK_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.QUESTION_BULK_MAX_BYTES:
+            raise too_large
+    body = bytes(body)
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(str(e)))
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items
+
 @router.post("/questions/", response_model=schemas.Question)
-def create_question(question: schemas.QuestionCreate, db: Session = Depends(database.get_db)):
+async def create_question(question: schemas.QuestionCreate, db: AsyncSession = Depends(database.get_async_db)):
     db_question = models.Question(**question.model_dump())
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    await db.commit()
+    await db.refresh(db_question)
+    await question_cache.invalidate(groups=[LIST_PAGES])
+    question_sampler.add(db_question.id, db_question.topic, db_question.difficulty)
     return db_question
 
+@router.post("/questions/bulk", response_model=schemas.BulkResult)
+async def bulk_upsert_questions(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    """Creates or replaces a batch of questions in one transaction.
+
+    Takes a JSON array or NDJSON of questions; one with an `id` replaces that
+    question, or is created with that id if it doesn't exist. Returns the
+    outcome of each item in request order.
+    """
+    parsed = bulk.parse_upserts(await read_batch(request))
+    try:
+        result = await bulk.upsert_questions(db, parsed)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="The batch conflicted with a concurrent write; nothing was applied")
+    await question_cache.invalidate(
+        [question_key(item.id) for item in result.items if item.status == "updated"], groups=[LIST_PAGES]
+    )
+    for item in result.items:
+        if item.status in ("created", "updated"):
+            written = parsed[item.index][1]
+            question_sampler.add(item.id, written.topic, written.difficulty)
+    return result
+
+@router.post("/questions/bulk/delete", response_model=schemas.BulkResult)
+async def bulk_delete_questions(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    """Deletes a batch of questions, given as a JSON array or NDJSON of ids, in one transaction."""
+    result = await bulk.delete_questions(db, bulk.parse_ids(await read_batch(request)))
+    deleted = [item.id for item in result.items if item.status == "deleted"]
+    await question_cache.invalidate([question_key(question_id) for question_id in deleted], groups=[LIST_PAGES])
+    for question_id in deleted:
+        question_sampler.discard(question_id)
+    return result
+
+# Registered before /questions/{question_id} so "sample" and "search" aren't taken for ids.
+@router.get("/questions/sample", response_model=List[schemas.Question])
+async def sample_questions(
+    n: int = Query(10, ge=1, le=settings.QUESTION_SAMPLE_MAX),
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    exclude: List[int] = Query([]),
+    seed: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """Returns up to `n` random questions, skipping the ids in `exclude`.
+
+    Passing the same `seed` repeats the same quiz while the question bank is
+    unchanged.
+    """
+    await question_sampler.load(db)
+    ids = question_sampler.sample(n, topic, difficulty, exclude, seed)
+    if not ids:
+        return []
+    questions = {q.id: q for q in await db.scalars(select(models.Question).where(models.Question.id.in_(ids)))}
+    return [questions[question_id] for question_id in ids if question_id in questions]
+
+@router.get("/questions/search", response_model=List[schemas.Question])
+async def search_questions(
+    q: str = Query(..., min_length=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    return await search.search_questions(db, q, skip, limit)
+
 @router.get("/questions/{question_id}", response_model=schemas.Question)
-def read_question(question_id: int, db: Session = Depends(database.get_db)):
-    db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
-    if db_question is None:
-        raise HTTPException(status_code=404, detail="Question not found")
-    return db_question
+async def read_question(
+    question_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """Returns one question, from the response cache when it holds it."""
+    key = question_key(question_id)
+    cached = await question_cache.get(key)
+    if cached is None:
+        generation = await question_cache.generation()
+        db_question = await db.get(models.Question, question_id)
+        if db_question is None:
+            raise HTTPException(status_code=404, detail="Question not found")
+        cached = CachedResponse.build(QUESTION_JSON.dump_json(QUESTION_JSON.validate_python(db_question, from_attributes=True)))
+        await question_cache.put(key, cached, generation=generation)
+    return cached_response(cached, if_none_match)
 
 @router.get("/questions/", response_model=List[schemas.Question])
-def read_questions(skip: int = 0, limit: int = 10, db: Session = Depends(database.get_db)):
-    questions = db.query(models.Question).offset(skip).limit(limit).all()
-    return questions
+async def read_questions(
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.QUESTIONS_PAGE_SIZE, ge=1, le=settings.QUESTIONS_MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """Returns questions in id order, optionally filtered by topic and difficulty.
+
+    When more rows remain, the page's `X-Next-Cursor` header holds the cursor
+    for the next one. Pages are keyed on id, so every page costs the same
+    however deep it is; `skip` is still honoured for older clients but costs
+    O(skip). Pages are served from the response cache when it holds them.
+    """
+    key = "questions:" + pagination.encode_cursor(topic, difficulty, cursor, skip, limit)
+    cached = await question_cache.get(key)
+    if cached is not None:
+        return cached_response(cached, if_none_match)
+    generation = await question_cache.generation()
+
+    query = select(models.Question)
+    if topic is not None:
+        query = query.where(models.Question.topic == topic)
+    if difficulty is not None:
+        query = query.where(models.Question.difficulty == difficulty)
+    if cursor is not None:
+        try:
+            (last_id,) = pagination.decode_cursor(cursor, int)
+        except pagination.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(models.Question.id > last_id)
+    query = query.order_by(models.Question.id).offset(skip).limit(limit + 1)
+
+    questions = (await db.scalars(query)).all()
+    headers = {}
+    if len(questions) > limit:
+        questions = questions[:limit]
+        headers[pagination.CURSOR_HEADER] = pagination.encode_cursor(questions[-1].id)
+    body = QUESTION_LIST_JSON.dump_json(QUESTION_LIST_JSON.validate_python(questions, from_attributes=True))
+    cached = CachedResponse.build(body, headers)
+    await question_cache.put(key, cached, group=LIST_PAGES, generation=generation)
+    return cached_response(cached, if_none_match)
 
 @router.put("/questions/{question_id}", response_model=schemas.Question)
-def update_question(question_id: int, question: schemas.QuestionCreate, db: Session = Depends(database.get_db)):
-    db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
+async def update_question(question_id: int, question: schemas.QuestionCreate, db: AsyncSession = Depends(database.get_async_db)):
+    db_question = await db.get(models.Question, question_id)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
 
     for key, value in question.model_dump().items():
         setattr(db_question, key, value)
 
-    db.commit()
-    db.refresh(db_question)
+    await db.commit()
+    await db.refresh(db_question)
+    await question_cache.invalidate([question_key(question_id)], groups=[LIST_PAGES])
+    question_sampler.add(db_question.id, db_question.topic, db_question.difficulty)
     return db_question
 
 @router.delete("/questions/{question_id}", status_code=204)
-def delete_question(question_id: int, db: Session = Depends(database.get_db)):
-    db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
+async def delete_question(question_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_question = await db.get(models.Question, question_id)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
 
-    db.delete(db_question)
-    db.commit()
+    await db.delete(db_question)
+    await db.commit()
+    await question_cache.invalidate([question_key(question_id)], groups=[LIST_PAGES])
+    question_sampler.discard(question_id)
     return
@@ -1,142 +1,218 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import datetime
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from .. import models, database, security, auth, api_client, schemas
+from .. import models, database, security, auth, api_client, schemas, trades, pagination
+from ..ledger import wallet_ledger
+from ..group_commit import trade_committer
+from ..money import btc_to_sats, cents_to_usd, cost_cents, proceeds_cents, sats_to_btc, usd_to_cents
+from ..config import settings
 
 router = APIRouter()
 
+async def get_user_wallet(db: AsyncSession, current_user: auth.Principal):
+    if current_user.wallet_id is None:
+        return None
+    return await db.get(models.Wallet, current_user.wallet_id)
+
+def require_wallet_id(current_user: auth.Principal) -> int:
+    if current_user.wallet_id is None:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    return current_user.wallet_id
+
+async def execute_trade(db: AsyncSession, trade: trades.Trade) -> Optional[models.Wallet]:
+    """Runs a trade in its own transaction, or through the group committer when GROUP_COMMIT_ENABLED."""
+    if settings.GROUP_COMMIT_ENABLED:
+        return await trade_committer.submit(trade)
+    return await trades.execute(db, trade)
+
+def hasher_busy() -> HTTPException:
+    # A new exception per raise: a shared one would collect every raise's traceback.
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/token", response_model=auth.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.username == form_data.username))
+    verified, new_hash = False, None
+    if user:
+        try:
+            verified, new_hash = await security.password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        except security.HasherBusy:
+            raise hasher_busy()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     access_token = auth.create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
+    db_user = await db.scalar(select(models.User).where(models.User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = security.get_password_hash(user.password)
+    try:
+        hashed_password = await security.password_hasher.hash(user.password)
+    except security.HasherBusy:
+        raise hasher_busy()
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Create a wallet for the new user
     db_wallet = models.Wallet(user_id=db_user.id)
     db.add(db_wallet)
-    db.commit()
-    db.refresh(db_wallet)
+    await db.commit()
+    await db.refresh(db_wallet)
+    auth.principal_cache.invalidate(db_user.username)
 
     return db_user
 
 @router.get("/wallet/", response_model=schemas.Wallet)
-def get_wallet(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.user_id == current_user.id).first()
+async def get_wallet(current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Returns the wallet's balances, from the in-memory ledger projection when LEDGER_ENABLED."""
+    if settings.LEDGER_ENABLED:
+        db_wallet = await wallet_ledger.read(db, require_wallet_id(current_user))
+    else:
+        db_wallet = await get_user_wallet(db, current_user)
     if db_wallet is None:
         raise HTTPException(status_code=404, detail="Wallet not found")
     return db_wallet
 
-@router.post("/buy/")
-async def buy_btc(btc_amount: float, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.user_id == current_user.id).first()
-    if db_wallet is None:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-
+@router.post("/buy/", response_model=schemas.Wallet)
+async def buy_btc(btc_amount: float, current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    wallet_id = require_wallet_id(current_user)
     btc_price_usd = await api_client.get_btc_price_usd()
-    usd_to_spend = btc_amount * btc_price_usd
+    btc_amount_sats = btc_to_sats(btc_amount)
+    usd_to_spend = cost_cents(btc_amount_sats, usd_to_cents(btc_price_usd))
 
-    if db_wallet.usd_balance < usd_to_spend:
+    db_wallet = await execute_trade(db, trades.Trade("buy", wallet_id, btc_amount_sats, usd_to_spend))
+    if db_wallet is None:
         raise HTTPException(status_code=400, detail="Insufficient USD balance")
-
-    db_wallet.usd_balance -= usd_to_spend
-    db_wallet.btc_balance += btc_amount
-
-    transaction = models.Transaction(
-        wallet_id=db_wallet.id,
-        transaction_type="buy",
-        btc_amount=btc_amount,
-        usd_amount=usd_to_spend,
-    )
-    db.add(transaction)
-    db.commit()
-    db.refresh(db_wallet)
     return db_wallet
 
-@router.post("/sell/")
-async def sell_btc(btc_amount: float, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.user_id == current_user.id).first()
-    if db_wallet is None:
-        raise HTTPException(status_code=404, detail="Wallet not found")
+@router.post("/sell/", response_model=schemas.Wallet)
+async def sell_btc(btc_amount: float, current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    wallet_id = require_wallet_id(current_user)
+    btc_price_usd = await api_client.get_btc_price_usd()
+    btc_amount_sats = btc_to_sats(btc_amount)
+    usd_to_gain = proceeds_cents(btc_amount_sats, usd_to_cents(btc_price_usd))
 
-    if db_wallet.btc_balance < btc_amount:
+    db_wallet = await execute_trade(db, trades.Trade("sell", wallet_id, btc_amount_sats, usd_to_gain))
+    if db_wallet is None:
         raise HTTPException(status_code=400, detail="Insufficient BTC balance")
+    return db_wallet
 
-    btc_price_usd = await api_client.get_btc_price_usd()
-    usd_to_gain = btc_amount * btc_price_usd
+def _transaction_row_json(row) -> str:
+    data = dict(row._mapping)
+    data["btc_amount"] = sats_to_btc(data.pop("btc_amount_sats"))
+    data["usd_amount"] = cents_to_usd(data.pop("usd_amount_cents"))
+    data["timestamp"] = data["timestamp"].isoformat()
+    return json.dumps(data)
 
-    db_wallet.btc_balance -= btc_amount
-    db_wallet.usd_balance += usd_to_gain
+@router.get("/transactions/", response_model=List[schemas.Transaction])
+async def get_transactions(
+    response: Response,
+    limit: int = Query(settings.TRANSACTIONS_PAGE_SIZE, ge=1, le=settings.TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """Returns the wallet's transactions newest first, one page at a time.
+
+    When more rows remain, the page's `X-Next-Cursor` header holds the cursor
+    for the next one. Pages are keyed on (timestamp, id), so every page costs
+    the same however deep into the history it is.
+    """
+    wallet_id = require_wallet_id(current_user)
+    query = select(models.Transaction).where(models.Transaction.wallet_id == wallet_id)
+    if cursor is not None:
+        try:
+            timestamp, transaction_id = pagination.decode_cursor(cursor, datetime.datetime, int)
+        except pagination.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(models.Transaction.timestamp, models.Transaction.id) < (timestamp, transaction_id))
+    query = query.order_by(models.Transaction.timestamp.desc(), models.Transaction.id.desc()).limit(limit + 1)
+
+    transactions = (await db.scalars(query)).all()
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        response.headers[pagination.CURSOR_HEADER] = pagination.encode_cursor(last.timestamp, last.id)
+    return transactions
 
-    transaction = models.Transaction(
-        wallet_id=db_wallet.id,
-        transaction_type="sell",
-        btc_amount=btc_amount,
-        usd_amount=usd_to_gain,
+@router.get("/transactions/export")
+async def export_transactions(current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    """Streams the wallet's whole transaction history as NDJSON, oldest first.
+
+    Rows come off a server-side cursor in chunks of
+    TRANSACTIONS_EXPORT_CHUNK_SIZE as plain rows rather than ORM objects, so
+    memory use doesn't grow with the length of the history.
+    """
+    wallet_id = require_wallet_id(current_user)
+    transactions = models.Transaction.__table__
+    query = (
+        select(transactions)
+        .where(transactions.c.wallet_id == wallet_id)
+        .order_by(transactions.c.timestamp, transactions.c.id)
+        .execution_options(yield_per=settings.TRANSACTIONS_EXPORT_CHUNK_SIZE)
     )
-    db.add(transaction)
-    db.commit()
-    db.refresh(db_wallet)
-    return db_wallet
 
-@router.get("/transactions/", response_model=List[schemas.Transaction])
-def get_transactions(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.user_id == current_user.id).first()
-    if db_wallet is None:
-        raise HTTPException(status_code=404, detail="Wallet not found")
-    transactions = db.query(models.Transaction).filter(models.Transaction.wallet_id == db_wallet.id).all()
-    return transactions
+    async def rows():
+        result = await db.stream(query)
+        async for chunk in result.partitions():
+            yield "".join(_transaction_row_json(row) + "\n" for row in chunk)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 @router.post("/orders/", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.user_id == current_user.id).first()
+async def create_order(order: schemas.OrderCreate, current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    db_wallet = await get_user_wallet(db, current_user)
     if db_wallet is None:
         raise HTTPException(status_code=404, detail="Wallet not found")
 
+    btc_amount_sats = btc_to_sats(order.btc_amount)
     if order.order_type == "buy":
-        usd_needed = order.btc_amount * order.price_usd
-        if db_wallet.usd_balance < usd_needed:
+        usd_needed = cost_cents(btc_amount_sats, usd_to_cents(order.price_usd))
+        if db_wallet.usd_balance_cents < usd_needed:
             raise HTTPException(status_code=400, detail="Insufficient USD balance")
     elif order.order_type == "sell":
-        if db_wallet.btc_balance < order.btc_amount:
+        if db_wallet.btc_balance_sats < btc_amount_sats:
             raise HTTPException(status_code=400, detail="Insufficient BTC balance")
     else:
         raise HTTPException(status_code=400, detail="Invalid order type")
 
     db_order = models.Order(**order.model_dump(), wallet_id=db_wallet.id)
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await db.refresh(db_order)
     return db_order
 
 @router.delete("/orders/{order_id}", status_code=204)
-def cancel_order(order_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
+async def cancel_order(order_id: int, current_user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_async_db)):
+    db_order = await db.get(models.Order, order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    db_wallet = db.query(models.Wallet).filter(models.Wallet.id == db_order.wallet_id).first()
-    if db_wallet.user_id != current_user.id:
+    if db_order.wallet_id != current_user.wallet_id:
         raise HTTPException(status_code=403, detail="Not authorized to cancel this order")
 
     db_order.is_active = False
-    db.commit()
+    await db.commit()
     return
@@ -0,0 +1,153 @@
+"""Random question sampling without ORDER BY RANDOM().
+
+The sampler keeps the ids of every question bucketed by (topic, difficulty).
+A sample draws random positions in the matching buckets, so it costs O(n)
+for n questions rather than a sort of the whole table. Buckets support O(1)
+add and remove, which the question writes use to keep them current. Writes
+made by other processes or scripts are picked up by a full reload every
+QUESTION_SAMPLER_REFRESH_SECONDS.
+"""
+import asyncio
+import bisect
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+
+Key = Tuple[str, str]
+
+
+class QuestionSampler:
+    def __init__(self, refresh_interval: float = settings.QUESTION_SAMPLER_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._buckets: Dict[Key, List[int]] = {}
+        # id -> (bucket key, position in the bucket), for O(1) removal
+        self._positions: Dict[int, Tuple[Key, int]] = {}
+        self._loaded_at: Optional[float] = None
+        # Writes made while a reload is reading the table, replayed onto its result.
+        self._pending: Optional[list] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, question_id: int, topic: str, difficulty: str):
+        """Files a question under its topic and difficulty, moving it if they changed."""
+        if self._pending is not None:
+            self._pending.append((question_id, topic, difficulty))
+        key = (topic, difficulty)
+        current = self._positions.get(question_id)
+        if current is not None:
+            if current[0] == key:
+                return
+            self.discard(question_id)
+        bucket = self._buckets.setdefault(key, [])
+        self._positions[question_id] = (key, len(bucket))
+        bucket.append(question_id)
+
+    def discard(self, question_id: int):
+        if self._pending is not None:
+            self._pending.append((question_id, None, None))
+        entry = self._positions.pop(question_id, None)
+        if entry is None:
+            return
+        key, position = entry
+        bucket = self._buckets[key]
+        last = bucket.pop()
+        if last != question_id:
+            bucket[position] = last
+            self._positions[last] = (key, position)
+        if not bucket:
+            del self._buckets[key]
+
+    def clear(self):
+        self._buckets.clear()
+        self._positions.clear()
+        self._loaded_at = None
+
+    async def load(self, db: AsyncSession):
+        """Rebuilds the buckets from the database if they are missing or due a refresh.
+
+        The new buckets are built aside, with the writes made while the table
+        was being read replayed onto them, and replace the old ones at once,
+        so samples taken meanwhile see the old buckets whole.
+        """
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+                return
+            self._pending = []
+            try:
+                result = await db.execute(
+                    select(models.Question.id, models.Question.topic, models.Question.difficulty).order_by(models.Question.id)
+                )
+                fresh = QuestionSampler(self.refresh_interval)
+                for question_id, topic, difficulty in result:
+                    fresh.add(question_id, topic, difficulty)
+                for question_id, topic, difficulty in self._pending:
+                    if topic is None:
+                        fresh.discard(question_id)
+                    else:
+                        fresh.add(question_id, topic, difficulty)
+            finally:
+                self._pending = None
+            self._buckets, self._positions = fresh._buckets, fresh._positions
+            self._loaded_at = time.monotonic()
+
+    def sample(
+        self,
+        n: int,
+        topic: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        exclude: Iterable[int] = (),
+        seed: Optional[int] = None,
+    ) -> List[int]:
+        """Returns up to `n` distinct random ids matching the filters, none of them in `exclude`.
+
+        The same seed gives the same sample for as long as the question bank
+        is unchanged.
+        """
+        buckets = [
+            bucket for (bucket_topic, bucket_difficulty), bucket in self._buckets.items()
+            if (topic is None or bucket_topic == topic) and (difficulty is None or bucket_difficulty == difficulty)
+        ]
+        ends = []
+        total = 0
+        for bucket in buckets:
+            total += len(bucket)
+            ends.append(total)
+
+        excluded = set()
+        for question_id in exclude:
+            entry = self._positions.get(question_id)
+            if entry is not None and (topic is None or entry[0][0] == topic) and (difficulty is None or entry[0][1] == difficulty):
+                excluded.add(question_id)
+        available = total - len(excluded)
+        n = min(n, available)
+        rng = random.Random(seed)
+
+        if n * 2 > available:
+            # Most of the pool is wanted, so rejection sampling would mostly
+            # draw repeats; sample the filtered pool directly instead.
+            pool = [question_id for bucket in buckets for question_id in bucket if question_id not in excluded]
+            return rng.sample(pool, n)
+
+        picked = []
+        seen = set(excluded)
+        while len(picked) < n:
+            index = rng.randrange(total)
+            b = bisect.bisect_right(ends, index)
+            question_id = buckets[b][index - (ends[b - 1] if b else 0)]
+            if question_id not in seen:
+                seen.add(question_id)
+                picked.append(question_id)
+        return picked
+
+
+question_sampler = QuestionSampler()
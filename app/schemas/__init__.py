@@ -1,2 +1,2 @@
-from .question import Question, QuestionCreate
+from .question import Question, QuestionCreate, QuestionUpsert, BulkItemResult, BulkResult
 from .trading import User, UserCreate, Wallet, Transaction, TransactionCreate, Order, OrderCreate
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 class QuestionBase(BaseModel):
@@ -9,8 +11,25 @@ class QuestionBase(BaseModel):
 class QuestionCreate(QuestionBase):
     pass
 
+class QuestionUpsert(QuestionBase):
+    """A bulk write: replaces question `id` if given and present, otherwise inserts."""
+    id: Optional[int] = None
+
 class Question(QuestionBase):
     id: int
 
     class Config:
         orm_mode = True
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    items: List[BulkItemResult]
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 import datetime
 
 class UserBase(BaseModel):
@@ -53,6 +54,7 @@ class Transaction(TransactionBase):
     id: int
     wallet_id: int
     timestamp: datetime.datetime
+    order_id: Optional[int] = None  # the filled order, for order fills
 
     class Config:
         orm_mode = True
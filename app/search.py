@@ -0,0 +1,79 @@
+"""Full-text search over questions.
+
+Postgres serves searches from a GIN index on a `tsvector` of the question and
+answer and ranks them with `ts_rank`. SQLite uses an FTS5 table kept in step
+with `questions` by triggers and ranks with `bm25`. Either way the index is
+updated incrementally by the same statement that writes the question.
+"""
+from typing import List
+
+from sqlalchemy import DDL, event, func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# No stemming: questions mix Arabic and English. Must match the config in
+# models.question_search_vector.
+TS_CONFIG = "simple"
+
+question_vector = models.question_search_vector(models.Question.question, models.Question.answer)
+
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+        question, answer, content='questions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions BEGIN
+        INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(models.Question.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(models.Question.__table__, "before_drop", DDL("DROP TABLE IF EXISTS questions_fts").execute_if(dialect="sqlite"))
+
+
+def ensure_search_index(conn):
+    """Creates the SQLite FTS index on a database that predates it, filling it from `questions`."""
+    if conn.dialect.name != "sqlite":
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'questions_fts'")).first()
+    if exists:
+        return
+    for statement in SQLITE_FTS_DDL:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"))
+
+
+def fts5_query(q: str) -> str:
+    """Quotes each word so user input is matched as plain terms, never as FTS5 syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+async def search_questions(db: AsyncSession, q: str, skip: int = 0, limit: int = 10) -> List[models.Question]:
+    """Returns the questions matching every word of `q`, best match first."""
+    if not q.split():
+        return []
+    if db.get_bind().dialect.name == "sqlite":
+        fts = text("SELECT rowid AS id, bm25(questions_fts) AS rank FROM questions_fts WHERE questions_fts MATCH :q")
+        matches = fts.columns(literal_column("id"), literal_column("rank")).bindparams(q=fts5_query(q)).subquery()
+        query = (
+            select(models.Question)
+            .join(matches, matches.c.id == models.Question.id)
+            .order_by(matches.c.rank, models.Question.id)
+        )
+    else:
+        ts_query = func.plainto_tsquery(literal_column(f"'{TS_CONFIG}'"), q)
+        query = (
+            select(models.Question)
+            .where(question_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank(question_vector, ts_query).desc(), models.Question.id)
+        )
+    result = await db.scalars(query.offset(skip).limit(limit))
+    return result.all()
@@ -1,9 +1,81 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .config import settings
+
+# Hashes made with a different work factor are flagged by verify_and_update
+# and upgraded on the user's next login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+def verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class HasherBusy(Exception):
+    """Raised when the password hasher's queue is full."""
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool with admission control.
+
+    At most `workers` hashes run at once, so logins can use no more than that
+    many cores however many arrive. Up to `max_pending` requests may be
+    running or queued; beyond that, calls fail fast with HasherBusy instead
+    of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int = settings.PASSWORD_HASH_WORKERS, max_pending: int = settings.PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusy()
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns whether the password matches, plus a new hash if the stored one is outdated."""
+        return await self._run(verify_and_update, plain_password, hashed_password)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
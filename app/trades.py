@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .ledger import wallet_ledger
+
+wallets_table = models.Wallet.__table__
+
+
+@dataclass(frozen=True)
+class Trade:
+    """A market buy or sell of `btc_amount_sats` for `usd_amount_cents`."""
+    transaction_type: str  # "buy" or "sell"
+    wallet_id: int
+    btc_amount_sats: int
+    usd_amount_cents: int
+
+
+async def apply(db: AsyncSession, trade: Trade) -> Optional[Tuple[models.Wallet, int]]:
+    """Debits and credits the wallet and records the transaction, without committing.
+
+    Returns the updated wallet and the new transaction's id, or None when the
+    wallet is missing or can't cover the trade, in which case nothing was
+    written.
+    """
+    if trade.transaction_type == "buy":
+        balance_check = wallets_table.c.usd_balance_cents >= trade.usd_amount_cents
+        values = {
+            "usd_balance_cents": wallets_table.c.usd_balance_cents - trade.usd_amount_cents,
+            "btc_balance_sats": wallets_table.c.btc_balance_sats + trade.btc_amount_sats,
+        }
+    else:
+        balance_check = wallets_table.c.btc_balance_sats >= trade.btc_amount_sats
+        values = {
+            "btc_balance_sats": wallets_table.c.btc_balance_sats - trade.btc_amount_sats,
+            "usd_balance_cents": wallets_table.c.usd_balance_cents + trade.usd_amount_cents,
+        }
+    # The balance check and the debit/credit are one conditional UPDATE, so
+    # concurrent trades on the same wallet can't both pass the check.
+    row = (await db.execute(
+        update(wallets_table)
+        .where(wallets_table.c.id == trade.wallet_id, balance_check)
+        .values(**values)
+        .returning(wallets_table)
+    )).first()
+    if row is None:
+        return None
+    # A detached copy, so that two trades on one wallet in the same session
+    # each keep the balances they left behind.
+    db_wallet = models.Wallet(**row._mapping)
+    transaction_id = await db.scalar(
+        insert(models.Transaction)
+        .values(
+            wallet_id=db_wallet.id,
+            transaction_type=trade.transaction_type,
+            btc_amount_sats=trade.btc_amount_sats,
+            usd_amount_cents=trade.usd_amount_cents,
+        )
+        .returning(models.Transaction.id)
+    )
+    return db_wallet, transaction_id
+
+
+def committed(db_wallet: models.Wallet, transaction_id: int) -> models.Wallet:
+    """Hands a committed trade's balances to the wallet ledger and returns the wallet."""
+    wallet_ledger.record(db_wallet.id, db_wallet.user_id, db_wallet.btc_balance_sats, db_wallet.usd_balance_cents, transaction_id)
+    return db_wallet
+
+
+async def execute(db: AsyncSession, trade: Trade) -> Optional[models.Wallet]:
+    """Applies `trade` in its own transaction. Returns the updated wallet, or None if it can't be covered."""
+    result = await apply(db, trade)
+    if result is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    return committed(*result)
+
+
+async def buy(db: AsyncSession, wallet_id: int, btc_amount_sats: int, usd_amount_cents: int) -> Optional[models.Wallet]:
+    """Moves `usd_amount_cents` into `btc_amount_sats` for the wallet and records the transaction.
+
+    Returns the updated wallet, or None when the wallet is missing or holds
+    less than `usd_amount_cents`.
+    """
+    return await execute(db, Trade("buy", wallet_id, btc_amount_sats, usd_amount_cents))
+
+
+async def sell(db: AsyncSession, wallet_id: int, btc_amount_sats: int, usd_amount_cents: int) -> Optional[models.Wallet]:
+    """Moves `btc_amount_sats` into `usd_amount_cents` for the wallet and records the transaction.
+
+    Returns the updated wallet, or None when the wallet is missing or holds
+    less than `btc_amount_sats`.
+    """
+    return await execute(db, Trade("sell", wallet_id, btc_amount_sats, usd_amount_cents))
@@ -1,5 +1,13 @@
-from celery import Celery
+import threading
+from contextlib import contextmanager
+
+from celery import Celery, chord, group
+from sqlalchemy import text
+
 from .config import settings
+from . import ledger, matcher
+from .money import cents_to_usd, sats_to_btc, usd_to_cents
+from .order_book import OrderBook
 
 celery = Celery(
     __name__,
@@ -13,50 +21,129 @@ celery.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    beat_schedule={
-        'process-orders-every-minute': {
-            'task': 'app.worker.process_orders',
-            'schedule': 60.0,
-        },
-    },
 )
 
+# One book per (shard, shard_count), built from the orders table the first time
+# this worker process matches that shard and kept in step incrementally after.
+_order_books = {}
+
+def get_order_book(db, shard: int = 0, shard_count: int = 1):
+    book = _order_books.get((shard, shard_count))
+    if book is None:
+        book = _order_books[(shard, shard_count)] = OrderBook(shard, shard_count)
+        book.load(db)
+    else:
+        book.sync(db)
+    return book
+
+# First key of the two-int advisory locks taken per shard; the second is the shard.
+SHARD_LOCK_NAMESPACE = 0x6D617463  # "matc"
+_shard_locks = {}
+
+@contextmanager
+def shard_lock(db, shard: int):
+    """Yields whether this session holds the shard's matching lock, without waiting for it.
+
+    On PostgreSQL this is a transaction-level advisory lock, so it is held
+    across every worker process until `db`'s transaction ends; elsewhere it
+    only excludes the other threads of this process.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        yield db.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:namespace, :shard)"),
+            {"namespace": SHARD_LOCK_NAMESPACE, "shard": shard},
+        )
+        return
+    lock = _shard_locks.setdefault(shard, threading.Lock())
+    if not lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        lock.release()
+
+def match_locked(db, current_price: float, shard: int = 0, shard_count: int = 1):
+    """Matches one shard unless another tick already is; returns its fills, or None if skipped.
+
+    Two ticks on the same shard would both see its crossed orders, so the
+    one that finds the shard's lock held skips instead of waiting.
+    """
+    with shard_lock(db, shard) as locked:
+        if not locked:
+            return None
+        return matcher.match_book(db, get_order_book(db, shard, shard_count), usd_to_cents(current_price))
+
+def match_orders(db, current_price: float, shard: int = 0, shard_count: int = 1) -> int:
+    """Fills the resting orders crossed by `current_price` and returns the fill count."""
+    return len(match_locked(db, current_price, shard, shard_count) or [])
+
 @celery.task
-def process_orders():
-    from . import database, models, api_client
-    db = next(database.get_db())
+def match_shard(current_price: float, shard: int, shard_count: int):
+    """Matches the orders of the wallets in one shard against `current_price`.
+
+    Shards split orders by `wallet_id % shard_count`, so every wallet a shard
+    touches belongs to it alone and shards never contend for the same rows.
+    A shard still being matched for an earlier price is skipped.
+    """
+    from . import database
+    db = database.SessionLocal()
+    try:
+        fills = match_locked(db, current_price, shard, shard_count)
+    finally:
+        db.close()
+    skipped = fills is None
+    fills = fills or []
+    return {
+        "shard": shard,
+        "skipped": skipped,
+        "fills": len(fills),
+        "btc_amount_sats": sum(fill.btc_amount_sats for fill in fills),
+        "usd_amount_cents": sum(fill.usd_amount_cents for fill in fills),
+    }
+
+@celery.task
+def collect_fill_stats(shard_stats, current_price: float):
+    return {
+        "price": current_price,
+        "shards": len(shard_stats),
+        "skipped_shards": sum(stats["skipped"] for stats in shard_stats),
+        "fills": sum(stats["fills"] for stats in shard_stats),
+        "btc_amount": sats_to_btc(sum(stats["btc_amount_sats"] for stats in shard_stats)),
+        "usd_amount": cents_to_usd(sum(stats["usd_amount_cents"] for stats in shard_stats)),
+    }
+
+def dispatch_price(current_price: float, shard_count: int = settings.MATCHER_SHARDS):
+    """Fans one price snapshot out to every shard and gathers their fill stats.
 
+    Returns the chord's AsyncResult, whose value is the `collect_fill_stats`
+    summary once every shard has finished.
+    """
+    header = group(match_shard.s(current_price, shard, shard_count) for shard in range(shard_count))
+    return chord(header)(collect_fill_stats.s(current_price))
+
+@celery.task
+def process_orders():
+    from . import api_client
     current_price = api_client.get_btc_price_usd_sync()
     if current_price is None:
         return
+    dispatch_price(current_price)
+
+@celery.task
+def snapshot_wallets():
+    """Writes a compact snapshot of every wallet's balance for ledger projections to restart from."""
+    from . import database
+    if not settings.LEDGER_ENABLED:
+        return None
+    db = database.SessionLocal()
+    try:
+        snapshot_id = ledger.write_snapshot(db)
+    finally:
+        db.close()
+    return {"snapshot": snapshot_id}
 
-    active_orders = db.query(models.Order).filter(models.Order.is_active == True).all()
-    for order in active_orders:
-        wallet = db.query(models.Wallet).filter(models.Wallet.id == order.wallet_id).first()
-        if order.order_type == "buy" and current_price <= order.price_usd:
-            usd_needed = order.btc_amount * order.price_usd
-            if wallet.usd_balance >= usd_needed:
-                wallet.usd_balance -= usd_needed
-                wallet.btc_balance += order.btc_amount
-                transaction = models.Transaction(
-                    wallet_id=wallet.id,
-                    transaction_type="buy",
-                    btc_amount=order.btc_amount,
-                    usd_amount=usd_needed,
-                )
-                db.add(transaction)
-                order.is_active = False
-        elif order.order_type == "sell" and current_price >= order.price_usd:
-            if wallet.btc_balance >= order.btc_amount:
-                usd_gained = order.btc_amount * order.price_usd
-                wallet.btc_balance -= order.btc_amount
-                wallet.usd_balance += usd_gained
-                transaction = models.Transaction(
-                    wallet_id=wallet.id,
-                    transaction_type="sell",
-                    btc_amount=order.btc_amount,
-                    usd_amount=usd_gained,
-                )
-                db.add(transaction)
-                order.is_active = False
-    db.commit()
+if settings.LEDGER_ENABLED:
+    celery.conf.beat_schedule = {
+        "snapshot-wallets": {"task": snapshot_wallets.name, "schedule": settings.LEDGER_SNAPSHOT_INTERVAL_SECONDS},
+    }
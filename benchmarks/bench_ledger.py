@@ -0,0 +1,119 @@
+"""Measures how fast the wallet ledger replays trade events.
+
+The in-memory run folds N generated events over 100k wallets, which is the
+cost of catching a projection up once the rows have been fetched. With
+--database, the same events are written to a transactions table and timed
+through `WalletLedger.restore`, from a snapshot taken before the first
+event, so the fetch is included.
+
+    python benchmarks/bench_ledger.py --sizes 1000000 10000000
+    python benchmarks/bench_ledger.py --sizes 1000000 --database
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.ledger import WalletLedger, WalletState, write_snapshot
+
+WALLETS = 100_000
+INSERT_CHUNK = 100_000
+
+
+def generate(size, seed=0):
+    rng = random.Random(seed)
+    for transaction_id in range(1, size + 1):
+        yield (
+            transaction_id,
+            rng.randrange(1, WALLETS + 1),
+            "buy" if rng.random() < 0.5 else "sell",
+            rng.randrange(1, 10**6),
+            rng.randrange(1, 10**5),
+        )
+
+
+def fresh_ledger():
+    ledger = WalletLedger(settle_seconds=0)
+    ledger.wallets = {wallet_id: WalletState(wallet_id, wallet_id, 10**12, 10**12, 0) for wallet_id in range(1, WALLETS + 1)}
+    return ledger
+
+
+def bench_memory(size):
+    events = list(generate(size))
+    ledger = fresh_ledger()
+    start = time.perf_counter()
+    ledger.replay(events)
+    return time.perf_counter() - start
+
+
+def bench_database(database_url, size):
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, WALLETS + 1)])
+        conn.execute(insert(models.Wallet), [
+            {"id": i, "user_id": i, "btc_balance_sats": 10**12, "usd_balance_cents": 10**12} for i in range(1, WALLETS + 1)
+        ])
+    with sessionmaker(bind=engine)() as db:
+        write_snapshot(db, settle_seconds=0)
+    with engine.begin() as conn:
+        batch = []
+        for transaction_id, wallet_id, transaction_type, btc_amount_sats, usd_amount_cents in generate(size):
+            batch.append({
+                "id": transaction_id,
+                "wallet_id": wallet_id,
+                "transaction_type": transaction_type,
+                "btc_amount_sats": btc_amount_sats,
+                "usd_amount_cents": usd_amount_cents,
+            })
+            if len(batch) == INSERT_CHUNK:
+                conn.execute(insert(models.Transaction), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Transaction), batch)
+
+    ledger = WalletLedger(settle_seconds=0)
+    with sessionmaker(bind=engine)() as db:
+        start = time.perf_counter()
+        ledger.restore(db)
+        elapsed = time.perf_counter() - start
+    engine.dispose()
+    assert ledger.events_applied == size
+    return elapsed
+
+
+def run(sizes, database_url):
+    print(f"{'events':>10} {'replay (s)':>11} {'events/s':>12}")
+    for size in sizes:
+        elapsed = bench_database(database_url, size) if database_url else bench_memory(size)
+        print(f"{size:>10} {elapsed:>11.3f} {size / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark wallet ledger replay.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--database", action="store_true", help="Replay from a database instead of memory.")
+    parser.add_argument(
+        "--database-url",
+        type=str,
+        default=None,
+        help="Database for --database; defaults to a temporary SQLite file."
+    )
+    args = parser.parse_args()
+
+    if not args.database:
+        run(args.sizes, None)
+    elif args.database_url:
+        run(args.sizes, args.database_url)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(args.sizes, f"sqlite:///{os.path.join(tmp, 'bench.db')}")
@@ -0,0 +1,112 @@
+"""Compares per-row and batched fill execution in the order matcher.
+
+Each run seeds a fresh database with N crossing buy orders spread over N/10
+wallets, then times one matching pass, reading the orders included. The
+per-row path is the matcher as it used to be: one ORM object per wallet and
+transaction, flushed on commit.
+
+    python benchmarks/bench_matcher.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import matcher, models
+from app.money import btc_to_sats, usd_to_cents
+from app.order_book import OrderBook
+
+PRICE = 50000.0
+
+
+def seed(engine, size):
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    wallet_count = max(1, size // 10)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, wallet_count + 1)
+        ])
+        conn.execute(insert(models.Wallet), [
+            {"id": i, "user_id": i, "btc_balance_sats": 0, "usd_balance_cents": usd_to_cents(1e9)} for i in range(1, wallet_count + 1)
+        ])
+        conn.execute(insert(models.Order), [
+            {
+                "wallet_id": i % wallet_count + 1,
+                "order_type": "buy",
+                "btc_amount_sats": btc_to_sats(0.01),
+                "price_cents": usd_to_cents(PRICE + i % 100),
+                "is_active": True,
+            }
+            for i in range(size)
+        ])
+
+
+def match_per_row(db, current_price):
+    active_orders = db.query(models.Order).filter(models.Order.is_active == True).all()
+    for order in active_orders:
+        wallet = db.query(models.Wallet).filter(models.Wallet.id == order.wallet_id).first()
+        if order.order_type == "buy" and current_price <= order.price_usd:
+            usd_needed = order.btc_amount * order.price_usd
+            if wallet.usd_balance >= usd_needed:
+                wallet.usd_balance -= usd_needed
+                wallet.btc_balance += order.btc_amount
+                db.add(models.Transaction(
+                    wallet_id=wallet.id,
+                    transaction_type="buy",
+                    btc_amount=order.btc_amount,
+                    usd_amount=usd_needed,
+                ))
+                order.is_active = False
+    db.commit()
+
+
+def match_batched(db, current_price):
+    book = OrderBook()
+    book.load(db)
+    matcher.match_book(db, book, usd_to_cents(current_price))
+
+
+def run(database_url, sizes):
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    print(f"{'orders':>8} {'per-row (s)':>12} {'batched (s)':>12} {'speedup':>8}")
+    for size in sizes:
+        seed(engine, size)
+        with Session() as db:
+            start = time.perf_counter()
+            match_per_row(db, PRICE)
+            per_row = time.perf_counter() - start
+
+        seed(engine, size)
+        with Session() as db:
+            start = time.perf_counter()
+            match_batched(db, PRICE)
+            batched = time.perf_counter() - start
+
+        print(f"{size:>8} {per_row:>12.3f} {batched:>12.3f} {per_row / batched:>7.1f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs batched order matching.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--database-url",
+        type=str,
+        default=None,
+        help="Database to benchmark against; defaults to a temporary SQLite file."
+    )
+    args = parser.parse_args()
+
+    if args.database_url:
+        run(args.database_url, args.sizes)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.sizes)
@@ -0,0 +1,91 @@
+"""Times the array-backed matching kernel against the Python matcher.
+
+Each run builds N random buy and sell orders around the price, spread over
+N/10 wallets with enough balance to cover them, then times one matching pass
+of each. Nothing touches a database: this is the cost of deciding the fills.
+
+    python benchmarks/bench_matching_kernel.py --sizes 10000 100000 1000000
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from app import matcher, matching_kernel
+from app.order_book import BookOrder, OrderBook
+
+PRICE_CENTS = 5_000_000
+
+
+def generate(size, seed=0):
+    rng = np.random.default_rng(seed)
+    wallet_count = max(1, size // 10)
+    orders = matching_kernel.OrderArrays(
+        np.arange(1, size + 1, dtype=np.int64),
+        rng.integers(1, wallet_count + 1, size, dtype=np.int64),
+        rng.random(size) < 0.5,
+        rng.integers(1, 10**7, size, dtype=np.int64),
+        rng.integers(PRICE_CENTS - 100_000, PRICE_CENTS + 100_000, size, dtype=np.int64),
+    )
+    balances = matching_kernel.BalanceArrays(
+        np.arange(1, wallet_count + 1, dtype=np.int64),
+        np.full(wallet_count, 10**10, dtype=np.int64),
+        np.full(wallet_count, 10**9, dtype=np.int64),
+    )
+    return orders, balances
+
+
+def time_kernel(orders, balances, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        filled, _ = matching_kernel.match(orders, balances, PRICE_CENTS)
+        best = min(best, time.perf_counter() - start)
+    return best, len(filled)
+
+
+def time_python(orders, balances):
+    book = OrderBook()
+    for row in zip(*(array.tolist() for array in (orders.id, orders.wallet_id, orders.is_buy, orders.btc_amount_sats, orders.price_cents))):
+        order_id, wallet_id, is_buy, sats, price = row
+        book.add(BookOrder(order_id, wallet_id, "buy" if is_buy else "sell", sats, price))
+    balance_dict = {
+        wallet_id: [btc, usd]
+        for wallet_id, btc, usd in zip(balances.wallet_id.tolist(), balances.btc_balance_sats.tolist(), balances.usd_balance_cents.tolist())
+    }
+    start = time.perf_counter()
+    fills = matcher.compute_fills(book.crossed(PRICE_CENTS), copy.deepcopy(balance_dict))
+    return time.perf_counter() - start, len(fills)
+
+
+def run(sizes, repeat, python_max):
+    print(f"{'orders':>8} {'fills':>8} {'kernel (ms)':>12} {'python (ms)':>12} {'speedup':>8}")
+    for size in sizes:
+        orders, balances = generate(size)
+        kernel, fill_count = time_kernel(orders, balances, repeat)
+        if size <= python_max:
+            python, python_fills = time_python(orders, balances)
+            assert python_fills == fill_count
+            print(f"{size:>8} {fill_count:>8} {kernel * 1000:>12.1f} {python * 1000:>12.1f} {python / kernel:>7.1f}x")
+        else:
+            print(f"{size:>8} {fill_count:>8} {kernel * 1000:>12.1f} {'-':>12} {'-':>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the array-backed matching kernel.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5, help="Kernel runs per size; the best is reported.")
+    parser.add_argument(
+        "--python-max",
+        type=int,
+        default=1000000,
+        help="Largest size to also time the Python matcher on."
+    )
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeat, args.python_max)
@@ -1,45 +1,194 @@
+import argparse
+import asyncio
+import hashlib
 import json
-import re
 import os
-import requests
-
-def download_images_from_jsonl(jsonl_file):
-    if not os.path.exists('images'):
-        os.makedirs('images')
-
-    with open(jsonl_file, 'r') as f:
-        for line in f:
-            data = json.loads(line)
-            text = data.get('text', '')
-            source_file = data.get('metadata', {}).get('source_file', '')
-
-            # Regex to find image URLs
-            image_urls = re.findall(r'img src="(.*?)"', text)
-
-            for url in image_urls:
-                if not url.startswith('http'):
-                    # Assuming the images are in the same repo
-                    base_url = "https://raw.githubusercontent.com/bregman-arie/devops-exercises/master/"
-                    full_url = base_url + url
-                else:
-                    full_url = url
-
-                try:
-                    response = requests.get(full_url, stream=True)
+import re
+import tempfile
+
+import httpx
+
+from app import ingest
+
+BASE_URL = "https://raw.githubusercontent.com/bregman-arie/devops-exercises/master/"
+MANIFEST_NAME = ".manifest.json"
+
+def image_urls(record):
+    """Returns the absolute URLs of the images referenced by a dataset record."""
+    text = record.get('text', '')
+
+    # Regex to find image URLs
+    urls = []
+    for url in re.findall(r'img src="(.*?)"', text):
+        if not url.startswith('http'):
+            # Assuming the images are in the same repo
+            url = BASE_URL + url
+        urls.append(url)
+    return urls
+
+def collect_image_urls(jsonl_file, workers=None):
+    """Returns every image URL in the dataset once, in order of first appearance."""
+    urls = {}
+    for chunk in ingest.iter_chunks(jsonl_file, image_urls, workers=workers):
+        for record_urls in chunk.records:
+            for url in record_urls:
+                urls.setdefault(url, None)
+    return list(urls)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_block(f, digest, block):
+    f.write(block)
+    digest.update(block)
+
+class ImageDownloader:
+    """
+    Downloads images concurrently through one pooled HTTP client.
+
+    Every download goes to a temporary file that is renamed into place once
+    complete, so an interrupted run never leaves a truncated image behind.
+    The manifest in the destination directory records the size, ETag and
+    SHA-256 of each finished download. On a rerun, files that still match
+    their manifest entry are skipped without a request. Files that exist but
+    are not in the manifest are checked with a HEAD request and kept when the
+    sizes match. Hashing and file writes run in worker threads, so they never
+    stall the other downloads, and an error with one URL, whether from the
+    network, the disk or a malformed response, only fails that URL.
+    """
+
+    def __init__(self, dest_dir='images', concurrency=8, client=None):
+        self.dest_dir = dest_dir
+        self.concurrency = concurrency
+        self.manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+        self.manifest = {}
+        self.downloaded = []
+        self.skipped = []
+        self.failed = []
+        self._client = client
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def save_manifest(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.dest_dir, prefix='.manifest-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def filename_for(self, url):
+        return os.path.join(self.dest_dir, os.path.basename(url))
+
+    def is_current(self, url, filename):
+        entry = self.manifest.get(url)
+        return (
+            entry is not None
+            and os.path.exists(filename)
+            and os.path.getsize(filename) == entry['size']
+            and file_sha256(filename) == entry['sha256']
+        )
+
+    def record(self, url, filename, size, etag, sha256=None):
+        self.manifest[url] = {
+            'file': os.path.basename(filename),
+            'size': size,
+            'etag': etag,
+            'sha256': sha256 or file_sha256(filename),
+        }
+
+    async def matches_remote(self, client, url, filename):
+        response = await client.head(url)
+        if response.status_code != 200:
+            return False
+        length = response.headers.get('content-length')
+        if length is None or int(length) != os.path.getsize(filename):
+            return False
+        await asyncio.to_thread(self.record, url, filename, int(length), response.headers.get('etag'))
+        return True
+
+    async def fetch(self, client, url, filename):
+        fd, tmp_path = tempfile.mkstemp(dir=self.dest_dir, prefix='.download-')
+        try:
+            size = 0
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as img_file:
+                async with client.stream('GET', url) as response:
                     response.raise_for_status()
+                    etag = response.headers.get('etag')
+                    async for block in response.aiter_bytes(65536):
+                        await asyncio.to_thread(write_block, img_file, digest, block)
+                        size += len(block)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.record(url, filename, size, etag, digest.hexdigest())
+
+    async def download_one(self, client, semaphore, url):
+        filename = self.filename_for(url)
+        async with semaphore:
+            try:
+                if await asyncio.to_thread(self.is_current, url, filename):
+                    self.skipped.append(url)
+                    return
+                if url not in self.manifest and os.path.exists(filename) and await self.matches_remote(client, url, filename):
+                    self.skipped.append(url)
+                    return
+                await self.fetch(client, url, filename)
+                self.downloaded.append(url)
+                print(f"Downloaded {url} to {filename}")
+            except (httpx.HTTPError, OSError, ValueError) as e:
+                print(f"Error downloading {url}: {e}")
+                self.failed.append(url)
 
-                    # Get the filename from the URL
-                    filename = os.path.join('images', os.path.basename(url))
+    async def download(self, urls):
+        os.makedirs(self.dest_dir, exist_ok=True)
+        self.load_manifest()
 
-                    with open(filename, 'wb') as img_file:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            img_file.write(chunk)
-                    print(f"Downloaded {full_url} to {filename}")
+        by_filename = {}
+        for url in urls:
+            other = by_filename.setdefault(self.filename_for(url), url)
+            if other != url:
+                print(f"Skipping {url}: {other} is already saved as {os.path.basename(url)}")
 
-                except requests.exceptions.RequestException as e:
-                    print(f"Error downloading {full_url}: {e}")
-                    with open("missing_images.txt", "a") as f:
-                        f.write(f"{full_url}\n")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        client = self._client or httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        try:
+            await asyncio.gather(*(self.download_one(client, semaphore, url) for url in by_filename.values()))
+        finally:
+            if self._client is None:
+                await client.aclose()
+            self.save_manifest()
+
+def download_images_from_jsonl(jsonl_file, dest_dir='images', concurrency=8, workers=None):
+    urls = collect_image_urls(jsonl_file, workers)
+    downloader = ImageDownloader(dest_dir, concurrency)
+    asyncio.run(downloader.download(urls))
+
+    if downloader.failed:
+        with open("missing_images.txt", "a") as f:
+            f.writelines(f"{url}\n" for url in downloader.failed)
+    print(
+        f"{len(downloader.downloaded)} downloaded, {len(downloader.skipped)} already present, "
+        f"{len(downloader.failed)} failed."
+    )
+    return downloader
 
 if __name__ == "__main__":
-    download_images_from_jsonl('dataset.jsonl (3).txt')
+    parser = argparse.ArgumentParser(description="Download the images referenced by the dataset.")
+    parser.add_argument("--file", type=str, default='dataset.jsonl (3).txt', help="The JSONL dataset to scan.")
+    parser.add_argument("--dest", type=str, default='images', help="Directory to save images into.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum simultaneous downloads.")
+    parser.add_argument("--workers", type=int, default=None, help="JSON decoding processes (0 decodes in the main process).")
+    args = parser.parse_args()
+
+    download_images_from_jsonl(args.file, args.dest, args.concurrency, args.workers)
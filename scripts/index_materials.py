@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import html
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+# Add the parent directory to the Python path to allow importing from 'app'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import engine
+from app.models import Base, Question, SourceFile
+from app.bulk import QUESTION_FIELDS, replace_question
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), '..', 'learning-materials', 'topics')
+DEFAULT_DIFFICULTY = "Unrated"
+IN_CLAUSE_CHUNK = 5000
+
+# <details><summary>question</summary><br><b>answer</b></details>. Some blocks
+# in the corpus are never closed, so an answer also ends at the next block.
+BLOCK = re.compile(r"<details>\s*<summary>(.*?)</summary>(.*?)(?=</details>|<details>|\Z)", re.S)
+TAG = re.compile(r"<[^>]+>")
+ANSWER_WRAPPER = re.compile(r"^(\s*<br\s*/?>|\s*<b>)+|(</b>\s*)+$")
+
+questions_table = Question.__table__
+source_files_table = SourceFile.__table__
+
+
+@dataclass
+class ParsedFile:
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    records: List[dict]
+
+
+@dataclass
+class IndexStats:
+    files: int = 0
+    parsed: int = 0
+    removed: int = 0
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    elapsed: float = 0.0
+
+
+def topic_for(path: str) -> str:
+    """The topic of a corpus file: its top-level directory, or its name for files at the root."""
+    parts = path.split("/")
+    return parts[0] if len(parts) > 1 else os.path.splitext(parts[0])[0]
+
+
+def parse_markdown(text: str) -> List[dict]:
+    """Returns the question/answer blocks of a markdown file, keyed by a hash of the question.
+
+    A question asked twice in one file gets a numbered key for each copy, so
+    every key is unique within the file.
+    """
+    records = []
+    seen: Dict[str, int] = {}
+    for summary, body in BLOCK.findall(text):
+        question = " ".join(html.unescape(TAG.sub("", summary)).split())
+        answer = ANSWER_WRAPPER.sub("", body).strip()
+        if not question or not answer:
+            continue
+        key = hashlib.sha1(question.encode()).hexdigest()[:16]
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = f"{key}-{seen[key]}"
+        records.append({"question": question, "answer": answer, "source_key": key})
+    return records
+
+
+def parse_file(root: str, path: str) -> ParsedFile:
+    with open(os.path.join(root, path), 'rb') as f:
+        data = f.read()
+    stat = os.stat(os.path.join(root, path))
+    return ParsedFile(
+        path, stat.st_size, stat.st_mtime_ns, hashlib.sha256(data).hexdigest(),
+        parse_markdown(data.decode('utf-8', errors='replace')),
+    )
+
+
+def find_markdown(root: str) -> Dict[str, os.stat_result]:
+    """Maps the path, relative to `root`, of every markdown file under it to its stat."""
+    found = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(".md"):
+                full_path = os.path.join(directory, name)
+                found[os.path.relpath(full_path, root).replace(os.sep, "/")] = os.stat(full_path)
+    return found
+
+
+def _chunks(items, size=IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def sync_file(conn, parsed: ParsedFile, difficulty: str, stats: IndexStats):
+    """Brings the questions of one file in line with its parsed records, keeping ids stable."""
+    topic = topic_for(parsed.path)
+    existing = {
+        row.source_key: row
+        for row in conn.execute(
+            select(questions_table.c.id, questions_table.c.source_key, *(questions_table.c[field] for field in QUESTION_FIELDS))
+            .where(questions_table.c.source_path == parsed.path)
+        )
+    }
+    updates, inserts = [], []
+    for record in parsed.records:
+        values = {"question": record["question"], "answer": record["answer"], "topic": topic}
+        row = existing.pop(record["source_key"], None)
+        if row is None:
+            inserts.append({**values, "difficulty": difficulty, "source_path": parsed.path, "source_key": record["source_key"]})
+        elif any(getattr(row, field) != value for field, value in values.items()):
+            updates.append({"b_id": row.id, "b_difficulty": row.difficulty, **{f"b_{field}": value for field, value in values.items()}})
+    if updates:
+        conn.execute(replace_question, updates)
+    if inserts:
+        conn.execute(questions_table.insert(), inserts)
+    stale = [row.id for row in existing.values()]
+    for chunk in _chunks(stale):
+        conn.execute(questions_table.delete().where(questions_table.c.id.in_(chunk)))
+    stats.created += len(inserts)
+    stats.updated += len(updates)
+    stats.deleted += len(stale)
+
+
+def index_materials(root: str = DEFAULT_ROOT, workers: Optional[int] = None, difficulty: str = DEFAULT_DIFFICULTY) -> IndexStats:
+    """
+    Turns the markdown question blocks under `root` into questions, incrementally.
+
+    Each file's size, mtime and SHA-256 are recorded in `source_files`. A file
+    whose size and mtime are unchanged is not opened again, and one whose
+    content hash is unchanged is not re-written, so a rerun after editing one
+    file parses and writes only that file. Changed files are parsed in a
+    process pool and their questions are updated in place, keyed on
+    (source_path, source_key), so question ids survive re-indexing. Questions
+    from deleted files, and deleted blocks, are removed. Everything is
+    written in one transaction.
+
+    Args:
+        root (str): The corpus directory; topics come from its subdirectories.
+        workers (int): Parsing processes; 0 parses in this process, None uses every core.
+        difficulty (str): Difficulty given to new questions, which the corpus doesn't record.
+    """
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    stats = IndexStats()
+    found = find_markdown(root)
+    stats.files = len(found)
+
+    with engine.begin() as conn:
+        known = {row.path: row for row in conn.execute(select(source_files_table))}
+        changed = [
+            path for path, stat in sorted(found.items())
+            if path not in known or (known[path].size, known[path].mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+        ]
+        if workers == 0 or len(changed) <= 1:
+            parsed_files = [parse_file(root, path) for path in changed]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed_files = list(executor.map(parse_file, [root] * len(changed), changed))
+
+        for parsed in parsed_files:
+            if parsed.path not in known or known[parsed.path].sha256 != parsed.sha256:
+                sync_file(conn, parsed, difficulty, stats)
+                stats.parsed += 1
+        if parsed_files:
+            conn.execute(source_files_table.delete().where(source_files_table.c.path.in_([parsed.path for parsed in parsed_files])))
+            conn.execute(source_files_table.insert(), [
+                {"path": parsed.path, "size": parsed.size, "mtime_ns": parsed.mtime_ns, "sha256": parsed.sha256}
+                for parsed in parsed_files
+            ])
+
+        removed = [path for path in known if path not in found]
+        for chunk in _chunks(removed):
+            stats.deleted += conn.execute(questions_table.delete().where(questions_table.c.source_path.in_(chunk))).rowcount
+            conn.execute(source_files_table.delete().where(source_files_table.c.path.in_(chunk)))
+        stats.removed = len(removed)
+
+    stats.elapsed = time.perf_counter() - started
+    logging.info(
+        f"Indexed {stats.files} files ({stats.parsed} changed, {stats.removed} removed) in {stats.elapsed:.3f}s: "
+        f"{stats.created} questions created, {stats.updated} updated, {stats.deleted} deleted."
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the learning-materials markdown into questions.")
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=DEFAULT_ROOT,
+        help="The corpus directory; each subdirectory is a topic."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Parsing processes (0 parses in the main process; default: one per core)."
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=str,
+        default=DEFAULT_DIFFICULTY,
+        help="Difficulty given to newly indexed questions."
+    )
+    args = parser.parse_args()
+
+    index_materials(args.root, args.workers, args.difficulty)
@@ -1,8 +1,12 @@
+import csv
+import io
 import json
 import sys
 import os
 import argparse
 import logging
+import time
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 
 # Add the parent directory to the Python path to allow importing from 'app'
@@ -10,6 +14,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.database import SessionLocal, engine
 from app.models import Question, Base
+from app import bulk, ingest
+from app.ingest import QUESTION_COLUMNS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -65,6 +71,135 @@ def load_data(data_file: str):
         db.close()
         logging.info("Database session closed.")
 
+def insert_ignoring_duplicates(dialect_name: str):
+    table = Question.__table__
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=["id"])
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=["id"])
+    raise ValueError(f"Bulk loading is not supported on {dialect_name}")
+
+def copy_rows(conn, rows):
+    """
+    Streams rows into Postgres with COPY through a temporary staging table,
+    then moves the new ones into questions in one INSERT ... ON CONFLICT DO NOTHING.
+    The stage is emptied after each batch, since every batch of a chunk shares
+    one transaction and ON COMMIT DELETE ROWS would only empty it at the end.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in QUESTION_COLUMNS])
+    buffer.seek(0)
+
+    columns = ", ".join(QUESTION_COLUMNS)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS questions_stage (LIKE questions INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+        cursor.copy_expert(f"COPY questions_stage ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(f"INSERT INTO questions ({columns}) SELECT {columns} FROM questions_stage ON CONFLICT (id) DO NOTHING")
+        inserted = cursor.rowcount
+        cursor.execute("TRUNCATE questions_stage")
+        return inserted
+    finally:
+        cursor.close()
+
+def read_checkpoint(checkpoint_file: str, data_file: str) -> int:
+    """Returns the byte offset to resume `data_file` from, or 0 to start over."""
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return 0
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("file") != os.path.abspath(data_file):
+        logging.warning(f"Checkpoint {checkpoint_file} is for another file, starting from the beginning.")
+        return 0
+    return checkpoint["offset"]
+
+def write_checkpoint(checkpoint_file: str, data_file: str, offset: int):
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({"file": os.path.abspath(data_file), "offset": offset}, f)
+    os.replace(tmp_file, checkpoint_file)
+
+def bulk_load_data(
+    data_file: str,
+    batch_size: int = 10000,
+    checkpoint_file: str = None,
+    use_copy: bool = False,
+    workers: int = None,
+    chunk_bytes: int = ingest.DEFAULT_CHUNK_BYTES,
+    json_backend: str = "auto",
+):
+    """
+    Streams question data from a JSONL file into the database in fixed-size batches.
+
+    The file is decoded and validated in parallel by `app.ingest`, and chunks
+    reach this process's single writer in file order. Each batch is one
+    multi-row INSERT ... ON CONFLICT DO NOTHING (or a COPY on Postgres with
+    `use_copy`), so memory stays bounded and existing ids are skipped by the
+    database instead of queried one at a time. With `checkpoint_file`, the
+    byte offset after each committed chunk is saved and a rerun resumes from it.
+    On Postgres the id sequence is advanced past the loaded ids at the end.
+
+    Args:
+        data_file (str): The path to the JSONL data file.
+        batch_size (int): Maximum rows per INSERT.
+        checkpoint_file (str): Optional path of the resume checkpoint.
+        use_copy (bool): Load through COPY (Postgres only).
+        workers (int): Decoding processes; 0 decodes in this process, None uses every core.
+        chunk_bytes (int): Approximate size of the chunks handed to the decoders.
+        json_backend (str): "json", "orjson", or "auto" to use orjson when installed.
+    """
+    Base.metadata.create_all(bind=engine)
+    dialect_name = engine.dialect.name
+    if use_copy and dialect_name != "postgresql":
+        raise ValueError("COPY loading requires Postgres")
+    statement = None if use_copy else insert_ignoring_duplicates(dialect_name)
+
+    offset = read_checkpoint(checkpoint_file, data_file)
+    if offset:
+        logging.info(f"Resuming {data_file} from byte {offset}.")
+
+    rows_inserted = 0
+    started = time.perf_counter()
+
+    def write(chunk):
+        nonlocal rows_inserted
+        with engine.begin() as conn:
+            for start in range(0, len(chunk.records), batch_size):
+                rows = chunk.records[start:start + batch_size]
+                if use_copy:
+                    inserted = copy_rows(conn, rows)
+                else:
+                    inserted = conn.execute(statement, rows).rowcount
+                if inserted is not None and inserted >= 0:
+                    rows_inserted += inserted
+        if checkpoint_file:
+            write_checkpoint(checkpoint_file, data_file, chunk.end)
+        if chunk.errors:
+            logging.error(f"Skipped {chunk.errors} invalid lines between bytes {chunk.start} and {chunk.end}.")
+        elapsed = time.perf_counter() - started
+        logging.info(f"Loaded up to byte {chunk.end}: {rows_inserted} rows inserted ({rows_inserted / elapsed:,.0f} rows/s).")
+
+    stats = ingest.run_pipeline(
+        data_file,
+        ingest.question_row,
+        write,
+        workers=workers,
+        chunk_bytes=chunk_bytes,
+        start_offset=offset,
+        json_backend=json_backend,
+    )
+    if dialect_name == "postgresql":
+        # The rows kept their ids, so the id sequence has to catch up with them.
+        with engine.begin() as conn:
+            conn.execute(bulk.advance_id_sequence_statement(conn.scalar(bulk.id_sequence_name)))
+    logging.info(
+        f"Loaded {stats.records} rows ({rows_inserted} new, {stats.errors} invalid) in {stats.elapsed:.2f}s, "
+        f"{stats.records_per_second:,.0f} rows/s."
+    )
+    return rows_inserted
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Load data into the quiz application database.")
     parser.add_argument(
@@ -73,6 +208,57 @@ if __name__ == "__main__":
         default="data/questions.jsonl",
         help="The path to the JSONL data file."
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Stream the file in batches with multi-row inserts that skip existing ids."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Maximum rows per INSERT in bulk mode."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Bulk mode: JSON decoding processes (0 decodes in the main process; default: one per core)."
+    )
+    parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        default=ingest.DEFAULT_CHUNK_BYTES,
+        help="Bulk mode: approximate bytes of input per decoding chunk."
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=["auto", "json", "orjson"],
+        default="auto",
+        help="Bulk mode: JSON decoder; auto uses orjson when it is installed."
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Bulk mode: file recording progress so an interrupted load can resume."
+    )
+    parser.add_argument(
+        "--copy",
+        action="store_true",
+        help="Bulk mode on Postgres: load each batch with COPY."
+    )
     args = parser.parse_args()
 
-    load_data(args.file)
\ No newline at end of file
+    if args.bulk:
+        bulk_load_data(
+            args.file,
+            args.batch_size,
+            args.checkpoint,
+            args.copy,
+            args.workers,
+            args.chunk_bytes,
+            args.json_backend,
+        )
+    else:
+        load_data(args.file)
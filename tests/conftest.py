@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import models
+
+# Point at a Postgres database (postgresql+asyncpg://...) to run the trade
+# stress tests against row-level locking instead of SQLite's database lock.
+ASYNC_DATABASE_URL = os.environ.get("TEST_ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./test_trades.db")
+
+
+@pytest.fixture
+def engine():
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def setup_wallet(engine):
+    """Recreates the schema with one user whose wallet holds the given balances."""
+    async def setup(usd_balance, btc_balance):
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+            await conn.run_sync(models.Base.metadata.create_all)
+        Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        async with Session() as db:
+            user = models.User(username="trader", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            wallet = models.Wallet(user_id=user.id, usd_balance=usd_balance, btc_balance=btc_balance)
+            db.add(wallet)
+            await db.commit()
+            return Session, wallet.id
+
+    return setup
+
+
+@pytest.fixture
+def wallet_state():
+    """Reads back the wallet and the number of transactions recorded against it."""
+    async def state(Session):
+        async with Session() as db:
+            wallet = await db.scalar(select(models.Wallet))
+            count = await db.scalar(select(func.count()).select_from(models.Transaction))
+            return wallet, count
+
+    return state
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.api_client import PriceFeed
+
+
+class StubCoinGecko:
+    def __init__(self):
+        self.price = 61000.0
+        self.status = 200
+        self.delay = 0.0
+        self.hits = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                body = json.dumps({"bitcoin": {"usd": stub.price}}).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/simple/price"
+
+
+@pytest.fixture
+def coingecko():
+    stub = StubCoinGecko()
+    thread = threading.Thread(target=stub.server.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def test_quote_is_cached_for_ttl(coingecko):
+    feed = PriceFeed(url=coingecko.url, ttl=60)
+    first = feed.get_quote_sync()
+    second = feed.get_quote_sync()
+    feed.close()
+
+    assert first.price == second.price == 61000.0
+    assert first.source == "live"
+    assert second.source == "cache"
+    assert not second.is_stale
+    assert coingecko.hits == 1
+
+
+def test_concurrent_callers_share_one_fetch(coingecko):
+    coingecko.delay = 0.2
+    feed = PriceFeed(url=coingecko.url, ttl=60)
+
+    async def burst():
+        quotes = await asyncio.gather(*(feed.get_quote() for _ in range(20)))
+        await feed.aclose()
+        return quotes
+
+    quotes = asyncio.run(burst())
+    assert {quote.price for quote in quotes} == {61000.0}
+    assert coingecko.hits == 1
+
+
+def test_upstream_failure_serves_last_price_as_stale(coingecko):
+    feed = PriceFeed(url=coingecko.url, ttl=0.05, fallback_price=1.0)
+    assert feed.get_quote_sync().price == 61000.0
+
+    coingecko.status = 500
+    time.sleep(0.1)
+    quote = feed.get_quote_sync()
+    feed.close()
+
+    assert quote.price == 61000.0
+    assert quote.source == "cache"
+    assert quote.is_stale
+    assert coingecko.hits == 2
+
+
+def test_fallback_price_without_any_successful_fetch(coingecko):
+    coingecko.status = 503
+    feed = PriceFeed(url=coingecko.url, ttl=60, fallback_price=42.0)
+    quote = asyncio.run(feed.get_quote())
+
+    assert quote.price == 42.0
+    assert quote.source == "fallback"
+    assert quote.is_stale
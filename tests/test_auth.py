@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app.auth import Principal, PrincipalCache
+
+
+def principal(n):
+    return Principal(id=n, username=f"user{n}", wallet_id=100 + n)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    cache.put("user1", principal(1))
+    cache.put("user2", principal(2))
+    assert cache.get("user1") == principal(1)
+    cache.put("user3", principal(3))
+
+    assert cache.get("user2") is None
+    assert cache.get("user1") == principal(1)
+    assert cache.get("user3") == principal(3)
+
+
+def test_entry_never_outlives_its_token():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("user1", principal(1), token_expires_at=time.time() - 1)
+    assert cache.get("user1") is None
+
+
+def test_invalidate_drops_entry():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("user1", principal(1))
+    cache.invalidate("user1")
+    assert cache.get("user1") is None
+
+
+def test_hasher_rejects_beyond_max_pending():
+    import asyncio
+
+    from app.security import HasherBusy, PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_pending=1)
+
+    async def burst():
+        return await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+
+    try:
+        first, second = asyncio.run(burst())
+    finally:
+        hasher.shutdown()
+    assert first.startswith("$2")
+    assert isinstance(second, HasherBusy)
+    assert hasher.metrics()["rejected"] == 1
+    assert hasher.metrics()["completed"] == 1
+
+
+def test_hasher_counts_only_successful_calls():
+    import asyncio
+
+    from app.security import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(hasher.verify_and_update("password", "not a hash"))
+    finally:
+        hasher.shutdown()
+    assert hasher.metrics()["completed"] == 0
@@ -0,0 +1,85 @@
+import asyncio
+
+from app.cache import CachedResponse, ResponseCache, etag_matches
+
+
+def test_cached_response_round_trips_through_redis_encoding():
+    response = CachedResponse.build(b'[{"id":1}]', {"X-Next-Cursor": "abc"})
+    assert CachedResponse.loads(response.dumps()) == response
+    assert etag_matches(response.etag, response.etag)
+    assert etag_matches(f'"other", W/{response.etag}', response.etag)
+    assert etag_matches("*", response.etag)
+    assert not etag_matches('"other"', response.etag)
+    assert not etag_matches(None, response.etag)
+
+
+def test_local_tier_evicts_least_recently_used_and_expires():
+    async def scenario():
+        cache = ResponseCache(maxsize=2, ttl=60, redis_url=None)
+        for key in ("a", "b"):
+            await cache.put(key, CachedResponse.build(key.encode()))
+        assert await cache.get("a") is not None
+        await cache.put("c", CachedResponse.build(b"c"))
+        assert await cache.get("b") is None
+        assert await cache.get("a") is not None
+
+        expired = ResponseCache(maxsize=2, ttl=0, redis_url=None)
+        await expired.put("a", CachedResponse.build(b"a"))
+        assert await expired.get("a") is None
+        return cache.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert (metrics["local_hits"], metrics["misses"], metrics["entries"]) == (2, 1, 2)
+
+
+def test_invalidating_a_group_drops_its_keys_only():
+    async def scenario():
+        cache = ResponseCache(maxsize=10, ttl=60, redis_url=None)
+        await cache.put("page:1", CachedResponse.build(b"1"), group="lists")
+        await cache.put("page:2", CachedResponse.build(b"2"), group="lists")
+        await cache.put("item:1", CachedResponse.build(b"i"))
+        await cache.invalidate(groups=["lists"])
+        return [await cache.get(key) is not None for key in ("page:1", "page:2", "item:1")]
+
+    assert asyncio.run(scenario()) == [False, False, True]
+
+
+def test_groups_forget_evicted_keys():
+    async def scenario():
+        cache = ResponseCache(maxsize=2, ttl=60, redis_url=None)
+        for page in range(5):
+            await cache.put(f"page:{page}", CachedResponse.build(b"p"), group="lists")
+        return cache._groups
+
+    assert asyncio.run(scenario()) == {"lists": {"page:3", "page:4"}}
+
+
+def test_read_through_started_before_an_invalidation_is_not_cached():
+    async def scenario():
+        cache = ResponseCache(maxsize=10, ttl=60, redis_url=None)
+        generation = await cache.generation()
+        await cache.invalidate(["item:1"])  # a write lands while the row is read
+        await cache.put("item:1", CachedResponse.build(b"stale"), generation=generation)
+        stale = await cache.get("item:1")
+        await cache.put("item:1", CachedResponse.build(b"fresh"), generation=await cache.generation())
+        return stale, await cache.get("item:1"), cache.metrics()["stale_puts"]
+
+    stale, fresh, stale_puts = asyncio.run(scenario())
+    assert (stale, fresh.body, stale_puts) == (None, b"fresh", 1)
+
+
+def test_redis_errors_fall_through_to_the_local_tier():
+    async def scenario():
+        # Nothing listens on port 1, so every Redis call fails to connect.
+        cache = ResponseCache(maxsize=10, ttl=60, redis_url="redis://127.0.0.1:1/0")
+        assert await cache.get("item:1") is None
+        await cache.put("item:1", CachedResponse.build(b"1"), generation=await cache.generation())
+        hit = await cache.get("item:1")
+        await cache.invalidate(["item:1"], groups=["lists"])
+        missed = await cache.get("item:1")
+        await cache.aclose()
+        return hit, missed, cache.metrics()["redis_errors"]
+
+    hit, missed, redis_errors = asyncio.run(scenario())
+    assert hit.body == b"1" and missed is None
+    assert redis_errors == 4
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import download_images
+
+IMAGES = {
+    "/images/a.png": b"a" * 5000,
+    "/images/b.png": b"b" * 300,
+    "/other/c.png": b"c" * 70000,
+}
+
+
+@pytest.fixture
+def image_server():
+    requests = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, send_body):
+            requests[(self.command, self.path)] += 1
+            body = IMAGES.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", f'"{len(body)}"')
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self._respond(True)
+
+        def do_HEAD(self):
+            self._respond(False)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dataset(tmp_path, image_server):
+    base_url, _ = image_server
+    path = tmp_path / "dataset.jsonl"
+    records = [
+        {"text": f'<img src="{base_url}/images/a.png"/> and <img src="{base_url}/images/b.png"/>'},
+        {"text": f'<img src="{base_url}/images/a.png"/> again'},
+        {"text": f'<img src="{base_url}/other/c.png"/> <img src="{base_url}/images/missing.png"/>'},
+    ]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+def test_downloads_each_image_once_and_resumes(dataset, image_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, requests = image_server
+    dest = tmp_path / "images"
+
+    first = download_images.download_images_from_jsonl(str(dataset), str(dest), concurrency=2, workers=0)
+    assert sorted(first.failed)[0].endswith("/images/missing.png")
+    assert len(first.downloaded) == 3
+    assert (dest / "a.png").read_bytes() == IMAGES["/images/a.png"]
+    assert (dest / "c.png").read_bytes() == IMAGES["/other/c.png"]
+    assert requests[("GET", "/images/a.png")] == 1
+    assert not [name for name in (p.name for p in dest.iterdir()) if name.startswith(".download-")]
+    assert (tmp_path / "missing_images.txt").read_text().strip().endswith("/images/missing.png")
+
+    second = download_images.download_images_from_jsonl(str(dataset), str(dest), concurrency=2, workers=0)
+    assert second.downloaded == []
+    assert len(second.skipped) == 3
+    assert requests[("GET", "/images/a.png")] == 1
+
+
+def test_existing_files_are_checked_against_remote_size(dataset, image_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, requests = image_server
+    dest = tmp_path / "images"
+    dest.mkdir()
+    (dest / "a.png").write_bytes(IMAGES["/images/a.png"])
+    (dest / "b.png").write_bytes(b"truncated")
+
+    result = download_images.download_images_from_jsonl(str(dataset), str(dest), concurrency=4, workers=0)
+
+    assert any(url.endswith("/images/a.png") for url in result.skipped)
+    assert requests[("GET", "/images/a.png")] == 0
+    assert requests[("GET", "/images/b.png")] == 1
+    assert (dest / "b.png").read_bytes() == IMAGES["/images/b.png"]
+    manifest = json.loads((dest / ".manifest.json").read_text())
+    assert {entry["file"] for entry in manifest.values()} == {"a.png", "b.png", "c.png"}
+
+
+def test_malformed_response_fails_only_its_url(tmp_path):
+    def respond(request):
+        if request.url.path == "/bad.png":
+            return httpx.Response(200, headers={"Content-Length": "12 bytes"})
+        return httpx.Response(200, content=b"good")
+
+    dest = tmp_path / "images"
+    dest.mkdir()
+    (dest / "bad.png").write_bytes(b"unlisted")  # not in the manifest, so its size is checked with HEAD
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            downloader = download_images.ImageDownloader(str(dest), client=client)
+            await downloader.download(["http://images/bad.png", "http://images/good.png"])
+        return downloader
+
+    downloader = asyncio.run(run())
+    assert downloader.failed == ["http://images/bad.png"]
+    assert downloader.downloaded == ["http://images/good.png"]
+    assert (dest / "good.png").read_bytes() == b"good"
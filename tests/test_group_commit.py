@@ -0,0 +1,41 @@
+import asyncio
+
+from app import models
+from app.group_commit import GroupCommitter
+from app.money import btc_to_sats, usd_to_cents
+from app.trades import Trade
+
+
+def test_grouped_buys_never_overdraw_and_each_get_their_own_result(setup_wallet, wallet_state):
+    async def scenario():
+        Session, wallet_id = await setup_wallet(usd_balance=100000.0, btc_balance=0.0)
+        committer = GroupCommitter(window=0.005, max_batch=64, session_factory=Session)
+        trade = Trade("buy", wallet_id, btc_to_sats(0.1), usd_to_cents(5000.0))
+        results = await asyncio.gather(*(committer.submit(trade) for _ in range(50)))
+        await committer.aclose()
+        return committer, results, await wallet_state(Session)
+
+    committer, results, (wallet, transaction_count) = asyncio.run(scenario())
+    filled = [result for result in results if result is not None]
+    assert len(filled) == 20 and transaction_count == 20
+    assert sorted(result.usd_balance for result in filled) == [5000.0 * i for i in range(20)]
+    assert wallet.usd_balance == 0.0 and wallet.btc_balance_sats == btc_to_sats(2.0)
+    assert committer.batches < 50
+
+
+def test_batches_are_capped_and_a_failing_trade_fails_alone(setup_wallet, wallet_state):
+    async def scenario():
+        Session, wallet_id = await setup_wallet(usd_balance=0.0, btc_balance=1.0)
+        committer = GroupCommitter(window=0.005, max_batch=4, session_factory=Session)
+        sells = [Trade("sell", wallet_id, btc_to_sats(0.1), usd_to_cents(100.0)) for _ in range(9)]
+        bad = Trade("sell", wallet_id, 1, 2**70)  # doesn't fit a 64-bit column
+        results = await asyncio.gather(*(committer.submit(trade) for trade in sells + [bad]), return_exceptions=True)
+        await committer.aclose()
+        return committer, results, await wallet_state(Session)
+
+    committer, results, (wallet, transaction_count) = asyncio.run(scenario())
+    assert isinstance(results[-1], Exception)
+    assert all(isinstance(result, models.Wallet) for result in results[:-1])
+    assert transaction_count == 9
+    assert wallet.btc_balance_sats == btc_to_sats(0.1) and wallet.usd_balance == 900.0
+    assert committer.largest_batch <= 4 and committer.retried_batches == 1
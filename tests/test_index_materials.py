@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.models import Question
+from scripts import index_materials
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'index.db'}")
+    monkeypatch.setattr(index_materials, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def block(question, answer):
+    return f"<details> <summary>{question}</summary><br><b> {answer} </b></details> "
+
+
+def write(path, *blocks, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("# Heading " + "".join(blocks), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def questions(engine):
+    with engine.connect() as conn:
+        return {
+            (row.topic, row.question): (row.id, row.answer)
+            for row in conn.execute(select(Question.id, Question.topic, Question.question, Question.answer))
+        }
+
+
+def test_parse_markdown_handles_unclosed_blocks_and_duplicates():
+    text = (
+        block("What is <code>ls</code>?", "Lists files")
+        + "<details> <summary>Unclosed?</summary><br><b> Still parsed"
+        + block("What is <code>ls</code>?", "Asked again")
+        + "<details><summary>No answer</summary></details>"
+    )
+    records = index_materials.parse_markdown(text)
+    assert [(r["question"], r["answer"]) for r in records] == [
+        ("What is ls?", "Lists files"), ("Unclosed?", "Still parsed"), ("What is ls?", "Asked again"),
+    ]
+    assert records[2]["source_key"] == records[0]["source_key"] + "-2"
+
+
+def test_reindexing_touches_only_changed_files(engine, tmp_path):
+    root = tmp_path / "topics"
+    write(root / "docker" / "README.md", block("What is Docker?", "Containers"), block("What is an image?", "Layers"))
+    write(root / "linux" / "exercises" / "copy" / "README.md", block("How to copy?", "cp"))
+    write(root / "git" / "README.md", block("What is git?", "A VCS"))
+
+    stats = index_materials.index_materials(str(root), workers=2)
+    assert (stats.files, stats.parsed, stats.created) == (3, 3, 4)
+    before = questions(engine)
+    assert ("linux", "How to copy?") in before
+
+    stats = index_materials.index_materials(str(root))
+    assert (stats.parsed, stats.created, stats.updated, stats.deleted) == (0, 0, 0, 0)
+
+    # Touched but identical content is fingerprinted again without a write.
+    os.utime(root / "git" / "README.md", ns=(1, 1))
+    assert index_materials.index_materials(str(root)).parsed == 0
+
+    write(root / "docker" / "README.md", block("What is Docker?", "A container runtime"), block("What is a volume?", "Storage"))
+    (root / "git" / "README.md").unlink()
+    stats = index_materials.index_materials(str(root))
+    assert (stats.parsed, stats.removed, stats.created, stats.updated, stats.deleted) == (1, 1, 1, 1, 2)
+
+    after = questions(engine)
+    assert after[("docker", "What is Docker?")] == (before[("docker", "What is Docker?")][0], "A container runtime")
+    assert after[("linux", "How to copy?")] == before[("linux", "How to copy?")]
+    assert ("docker", "What is an image?") not in after and ("git", "What is git?") not in after
+    assert ("docker", "What is a volume?") in after
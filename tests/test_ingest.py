@@ -0,0 +1,76 @@
+import json
+import threading
+
+import pytest
+
+from app import ingest
+
+
+@pytest.fixture
+def questions_file(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, 501):
+            f.write(json.dumps({"id": i, "question": f"سؤال {i}", "answer": "A", "topic": "T", "difficulty": "Easy"}) + "\n")
+            if i % 100 == 0:
+                f.write("{broken\n")
+                f.write(json.dumps({"id": -i}) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_pipeline_delivers_records_in_file_order(questions_file, workers):
+    written = []
+    stats = ingest.run_pipeline(
+        str(questions_file), ingest.question_row, lambda chunk: written.extend(chunk.records),
+        workers=workers, chunk_bytes=1024,
+    )
+
+    assert [row["id"] for row in written] == list(range(1, 501))
+    assert stats.records == 500
+    assert stats.errors == 10
+    assert stats.chunks > 1
+    assert stats.end_offset == questions_file.stat().st_size
+
+
+def test_ranges_end_on_line_boundaries(questions_file):
+    data = questions_file.read_bytes()
+    ranges = ingest.split_ranges(str(questions_file), chunk_bytes=1000)
+
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_writer_failure_stops_the_pipeline(questions_file):
+    def write(chunk):
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError, match="database down"):
+        ingest.run_pipeline(str(questions_file), ingest.question_row, write, workers=2, chunk_bytes=1024)
+
+
+def test_records_that_are_not_objects_are_errors(tmp_path):
+    path = tmp_path / "mixed.jsonl"
+    path.write_text('[1, 2]\n"text"\n5\nnull\n{"id": 1}\n')
+    chunk = ingest.decode_range(str(path), 0, path.stat().st_size, dict)
+    assert [row["id"] for row in chunk.records] == [1]
+    assert chunk.errors == 4
+
+
+def test_decoding_failure_stops_the_writer(questions_file):
+    def handler(record):
+        raise KeyError("bad handler")
+
+    with pytest.raises(KeyError):
+        ingest.run_pipeline(str(questions_file), handler, lambda chunk: None, workers=0, chunk_bytes=1024)
+    assert not any(thread.name == "ingest-writer" for thread in threading.enumerate())
+
+
+def test_question_rows_with_mistyped_values_are_rejected():
+    row = {"id": 1, "question": "Q", "answer": "A", "topic": "T", "difficulty": "Easy"}
+    assert ingest.question_row(row) == row
+    for bad in ({"id": "abc"}, {"id": True}, {"id": 1.5}, {"answer": None}, {"topic": 3}, {"question": ["Q"]}):
+        assert ingest.question_row({**row, **bad}) is None
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import matcher, models
+from app.ledger import WalletLedger, write_snapshot
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in (1, 2, 3)])
+        conn.execute(insert(models.Wallet), [
+            {"id": i, "user_id": i, "btc_balance_sats": 10**8, "usd_balance_cents": 10**7} for i in (1, 2, 3)
+        ])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def trade(db, *fills):
+    orders = [
+        models.Order(wallet_id=wallet_id, order_type=order_type, btc_amount_sats=btc_amount_sats, price_cents=0)
+        for wallet_id, order_type, btc_amount_sats, _ in fills
+    ]
+    db.add_all(orders)
+    db.flush()
+    matcher.apply_fills(db, [matcher.Fill(order.id, *fill) for order, fill in zip(orders, fills)])
+    db.commit()
+
+
+def wallet_rows(db):
+    return {
+        wallet.id: (wallet.btc_balance_sats, wallet.usd_balance_cents)
+        for wallet in db.scalars(select(models.Wallet))
+    }
+
+
+def projection(ledger):
+    return {wallet_id: (state.btc_balance_sats, state.usd_balance_cents) for wallet_id, state in ledger.wallets.items()}
+
+
+def test_restore_without_snapshot_and_catch_up(Session):
+    with Session() as db:
+        trade(db, (1, "buy", 1000, 50), (2, "sell", 2000, 100))
+        ledger = WalletLedger(settle_seconds=0)
+        ledger.restore(db)
+        assert projection(ledger) == wallet_rows(db)
+
+        trade(db, (1, "sell", 500, 25), (3, "buy", 10, 1))
+        ledger.catch_up(db)
+        assert projection(ledger) == wallet_rows(db)
+        assert ledger.cursor == db.scalar(select(func.max(models.Transaction.id)))
+
+
+def test_snapshot_restore_replays_only_the_tail(Session):
+    with Session() as db:
+        trade(db, (1, "buy", 1000, 50), (2, "buy", 1000, 50))
+        write_snapshot(db, settle_seconds=0)
+        second = write_snapshot(db, settle_seconds=0)
+        assert db.scalar(select(func.count()).select_from(models.LedgerSnapshot)) == 1
+
+        trade(db, (2, "sell", 400, 20), (3, "sell", 100, 5))
+        restored = WalletLedger(settle_seconds=0)
+        restored.restore(db)
+        assert projection(restored) == wallet_rows(db)
+        assert restored.events_applied == 2  # only the events after the snapshot
+        assert db.scalar(select(models.LedgerSnapshot.id)) == second
+
+
+def test_events_already_folded_in_are_ignored(Session):
+    with Session() as db:
+        ledger = WalletLedger(settle_seconds=60)
+        ledger.restore(db)
+        trade(db, (1, "buy", 1000, 50))
+        ledger.catch_up(db)
+        ledger.catch_up(db)  # the unsettled event is read again, but not applied again
+        assert ledger.cursor == 0
+        assert projection(ledger) == wallet_rows(db)
+
+        # A trade's returned balances supersede older events still to be replayed.
+        trade(db, (1, "buy", 1000, 50))
+        latest = db.scalar(select(func.max(models.Transaction.id)))
+        ledger.record(1, 1, 7, 7, latest)
+        ledger.catch_up(db)
+        assert projection(ledger)[1] == (7, 7)
+
+
+def test_snapshot_re_reads_unsettled_transactions_without_reapplying_them(Session):
+    with Session() as db:
+        trade(db, (1, "buy", 1000, 50), (2, "sell", 2000, 100))
+        write_snapshot(db, settle_seconds=60)
+        assert db.scalar(select(models.LedgerSnapshot.through_transaction_id)) == 0
+
+        restored = WalletLedger(settle_seconds=0)
+        restored.restore(db)
+        assert projection(restored) == wallet_rows(db)
+        assert restored.events_applied == 0
+
+
+def test_load_restores_in_a_thread_and_keeps_balances_recorded_meanwhile(Session):
+    with Session() as db:
+        trade(db, (1, "buy", 1000, 50))
+        latest = db.scalar(select(func.max(models.Transaction.id)))
+        rows = wallet_rows(db)
+
+    threads = []
+    ledger = WalletLedger(settle_seconds=0)
+
+    def session_factory():
+        threads.append(threading.get_ident())
+        ledger.record(2, 2, 7, 7, latest + 1)  # a trade committing during the restore
+        return Session()
+    ledger.session_factory = session_factory
+
+    asyncio.run(ledger.load())
+    assert threads and threads[0] != threading.get_ident()
+    assert projection(ledger) == {**rows, 2: (7, 7)}
+    ledger.record(3, 3, 1, 1, latest + 2)
+    assert projection(ledger)[3] == (1, 1)
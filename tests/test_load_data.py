@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models import Question
+from scripts import load_data
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    monkeypatch.setattr(load_data, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def write_questions(path, ids):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in ids:
+            f.write(json.dumps({"id": i, "question": f"Q{i}", "answer": "A", "topic": "T", "difficulty": "Easy"}) + "\n")
+        f.write("not json\n")
+
+
+def count_questions(engine):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(Question))
+
+
+def test_bulk_load_skips_existing_ids(engine, tmp_path):
+    data_file = tmp_path / "questions.jsonl"
+    write_questions(data_file, range(1, 26))
+
+    assert load_data.bulk_load_data(str(data_file), batch_size=10) == 25
+    write_questions(data_file, range(20, 31))
+    assert load_data.bulk_load_data(str(data_file), batch_size=10) == 5
+    assert count_questions(engine) == 30
+
+
+def test_bulk_load_resumes_from_checkpoint(engine, tmp_path):
+    data_file = tmp_path / "questions.jsonl"
+    checkpoint = tmp_path / "load.checkpoint"
+    write_questions(data_file, range(1, 21))
+    with open(data_file, "rb") as f:
+        first_batch_end = sum(len(f.readline()) for _ in range(10))
+    load_data.write_checkpoint(str(checkpoint), str(data_file), first_batch_end)
+
+    assert load_data.bulk_load_data(str(data_file), batch_size=10, checkpoint_file=str(checkpoint)) == 10
+    with engine.connect() as conn:
+        assert conn.scalar(select(func.min(Question.id))) == 11
+    assert load_data.read_checkpoint(str(checkpoint), str(data_file)) == data_file.stat().st_size
@@ -1,34 +1,51 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
 from app.models import Base, Question
-from app.database import get_db
+from app.database import get_async_db
+from app.cache import question_cache
+from app.sampling import question_sampler
+from app.ledger import wallet_ledger
+from app import pagination
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs each request on a fresh event loop, so connections can't be pooled.
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base.metadata.create_all(bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
+def read_metrics(monkeypatch):
+    monkeypatch.setattr("app.config.settings.METRICS_TOKEN", "metrics-token")
+    return client.get("/metrics", headers={"Authorization": "Bearer metrics-token"}).json()
+
 @pytest.fixture(scope="function")
 def db_session():
     Base.metadata.create_all(bind=engine)
+    # Ids restart with each fresh database, so earlier tests' responses must go.
+    question_cache.clear()
+    question_sampler.clear()
+    wallet_ledger.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -63,6 +80,142 @@ def test_read_questions(db_session):
     assert data[0]["question"] == "Q1"
     assert data[1]["question"] == "Q2"
 
+def test_read_questions_keyset_pages_and_filters(db_session):
+    db_session.add_all([
+        Question(question=f"Q{i}", answer="A", topic="Docker" if i % 2 else "Linux", difficulty="Easy" if i % 3 else "Hard")
+        for i in range(10)
+    ])
+    db_session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"topic": "Docker", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/questions/", params=params)
+        assert response.status_code == 200
+        seen += [q["question"] for q in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == ["Q1", "Q3", "Q5", "Q7", "Q9"]
+
+    response = client.get("/questions/", params={"topic": "Docker", "difficulty": "Hard"})
+    assert [q["question"] for q in response.json()] == ["Q3", "Q9"]
+    assert "X-Next-Cursor" not in response.headers
+    assert client.get("/questions/", params={"cursor": "not-a-cursor"}).status_code == 400
+    crafted = pagination.encode_cursor("x")
+    assert client.get("/questions/", params={"cursor": crafted}).status_code == 400
+
+def test_question_reads_are_cached_until_written(db_session, monkeypatch):
+    question = Question(question="Cached?", answer="Yes", topic="Cache", difficulty="Easy")
+    db_session.add(question)
+    db_session.commit()
+    before = question_cache.metrics()
+
+    first = client.get(f"/questions/{question.id}")
+    etag = first.headers["ETag"]
+    assert client.get(f"/questions/{question.id}").content == first.content
+    assert client.get(f"/questions/{question.id}", headers={"If-None-Match": etag}).status_code == 304
+    page = client.get("/questions/", params={"topic": "Cache"})
+    assert client.get("/questions/", params={"topic": "Cache"}).json() == page.json()
+
+    # A write behind the API's back is invisible until the entry goes...
+    db_session.query(Question).filter(Question.id == question.id).update({"answer": "Stale"})
+    db_session.commit()
+    assert client.get(f"/questions/{question.id}").json()["answer"] == "Yes"
+
+    # ...while writes through the API invalidate the question and every list page.
+    client.put(f"/questions/{question.id}", json={"question": "Cached?", "answer": "Fresh", "topic": "Cache", "difficulty": "Easy"})
+    response = client.get(f"/questions/{question.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["answer"] == "Fresh"
+    assert client.get("/questions/", params={"topic": "Cache"}).json()[0]["answer"] == "Fresh"
+    client.post("/questions/", json={"question": "New", "answer": "A", "topic": "Cache", "difficulty": "Easy"})
+    assert len(client.get("/questions/", params={"topic": "Cache"}).json()) == 2
+    client.delete(f"/questions/{question.id}")
+    assert client.get(f"/questions/{question.id}").status_code == 404
+
+    after = read_metrics(monkeypatch)["question_cache"]
+    assert after["local_hits"] - before["local_hits"] == 4
+    assert after["not_modified"] - before["not_modified"] == 1
+    assert after["invalidations"] - before["invalidations"] == 3
+
+def test_bulk_upsert_and_delete_questions(db_session):
+    existing = Question(question="Old", answer="A", topic="Bulk", difficulty="Easy")
+    db_session.add(existing)
+    db_session.commit()
+    client.get(f"/questions/{existing.id}")  # cache it, to check the bulk write invalidates it
+
+    response = client.post("/questions/bulk", json=[
+        {"question": "New 1", "answer": "A", "topic": "Bulk", "difficulty": "Easy"},
+        {"id": existing.id, "question": "Replaced", "answer": "B", "topic": "Bulk", "difficulty": "Hard"},
+        {"question": "Missing fields"},
+        {"id": 500, "question": "Keyed", "answer": "C", "topic": "Bulk", "difficulty": "Easy"},
+        {"id": 500, "question": "Again", "answer": "D", "topic": "Bulk", "difficulty": "Easy"},
+        {"question": "New 2", "answer": "A", "topic": "Bulk", "difficulty": "Easy"},
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["created"], result["updated"], result["failed"]) == (3, 1, 2)
+    statuses = [(item["index"], item["status"]) for item in result["items"]]
+    assert statuses == [(0, "created"), (1, "updated"), (2, "invalid"), (3, "created"), (4, "invalid"), (5, "created")]
+    assert result["items"][3]["id"] == 500
+    assert client.get(f"/questions/{existing.id}").json()["question"] == "Replaced"
+    assert client.get(f"/questions/{result['items'][5]['id']}").json()["question"] == "New 2"
+
+    ndjson = '{"id": 500, "question": "Keyed v2", "answer": "C", "topic": "Bulk", "difficulty": "Easy"}\nnot json\n'
+    response = client.post("/questions/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert [item["status"] for item in response.json()["items"]] == ["updated", "invalid"]
+    assert client.get("/questions/500").json()["question"] == "Keyed v2"
+
+    response = client.post("/questions/bulk/delete", json=[existing.id, 500, 999, "x"])
+    assert [item["status"] for item in response.json()["items"]] == ["deleted", "deleted", "not_found", "invalid"]
+    assert client.get("/questions/500").status_code == 404
+    assert [q["question"] for q in client.get("/questions/", params={"topic": "Bulk"}).json()] == ["New 1", "New 2"]
+    assert client.post("/questions/bulk", json={"not": "a list"}).status_code == 400
+
+def test_bulk_body_over_the_limit_is_refused(db_session, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "QUESTION_BULK_MAX_BYTES", 64)
+    batch = [{"question": "Q", "answer": "A", "topic": "T", "difficulty": "easy"}] * 10
+    assert client.post("/questions/bulk", json=batch).status_code == 413
+
+    def chunks():  # no Content-Length, so the cap applies while reading
+        yield json.dumps(batch).encode()
+    assert client.post("/questions/bulk", content=chunks()).status_code == 413
+    assert client.post("/questions/bulk", json=batch[:1]).status_code == 200
+
+def test_sample_questions(db_session):
+    db_session.add_all([
+        Question(question=f"Q{i}", answer="A", topic="Docker" if i < 30 else "Linux", difficulty="Easy" if i % 2 else "Hard")
+        for i in range(40)
+    ])
+    db_session.commit()
+
+    response = client.get("/questions/sample", params={"n": 5, "topic": "Docker", "difficulty": "Easy", "seed": 7})
+    assert response.status_code == 200
+    quiz = response.json()
+    assert len(quiz) == 5 and len({q["id"] for q in quiz}) == 5
+    assert all(q["topic"] == "Docker" and q["difficulty"] == "Easy" for q in quiz)
+    again = client.get("/questions/sample", params={"n": 5, "topic": "Docker", "difficulty": "Easy", "seed": 7}).json()
+    assert again == quiz
+
+    seen = [q["id"] for q in quiz]
+    rest = client.get("/questions/sample", params={"n": 20, "topic": "Docker", "difficulty": "Easy", "exclude": seen}).json()
+    assert len(rest) == 10
+    assert not {q["id"] for q in rest} & set(seen)
+
+    # Writes through the API update the index without a reload.
+    created = client.post("/questions/", json={"question": "New", "answer": "A", "topic": "Helm", "difficulty": "Easy"}).json()
+    assert [q["id"] for q in client.get("/questions/sample", params={"topic": "Helm"}).json()] == [created["id"]]
+    client.put(f"/questions/{created['id']}", json={"question": "New", "answer": "A", "topic": "Helm", "difficulty": "Hard"})
+    assert client.get("/questions/sample", params={"topic": "Helm", "difficulty": "Easy"}).json() == []
+    client.delete(f"/questions/{created['id']}")
+    assert client.get("/questions/sample", params={"topic": "Helm"}).json() == []
+
 def test_read_question(db_session):
     question = Question(question="Test Question", answer="Test Answer", topic="Test", difficulty="Easy")
     db_session.add(question)
@@ -107,6 +260,30 @@ def test_delete_question(db_session):
     response = client.delete("/questions/999")
     assert response.status_code == 404
 
+def test_search_questions(db_session):
+    db_session.add_all([
+        Question(question="What is a Docker volume?", answer="Persistent storage", topic="Docker", difficulty="Easy"),
+        Question(question="What is Kubernetes?", answer="A container orchestrator, often running Docker images. Docker Docker", topic="Kubernetes", difficulty="Medium"),
+        Question(question="ما هو دوكر؟", answer="منصة حاويات", topic="Docker", difficulty="Easy"),
+    ])
+    db_session.commit()
+
+    response = client.get("/questions/search", params={"q": "docker"})
+    assert response.status_code == 200
+    assert [q["question"] for q in response.json()] == ["What is Kubernetes?", "What is a Docker volume?"]
+    assert [q["question"] for q in client.get("/questions/search", params={"q": "docker", "skip": 1}).json()] == ["What is a Docker volume?"]
+    assert [q["answer"] for q in client.get("/questions/search", params={"q": "حاويات"}).json()] == ["منصة حاويات"]
+    assert client.get("/questions/search", params={"q": 'docker "OR'}).json() == []
+
+    # The index follows creates, updates and deletes.
+    created = client.post("/questions/", json={"question": "Helm charts", "answer": "Packages", "topic": "Kubernetes", "difficulty": "Hard"}).json()
+    assert [q["id"] for q in client.get("/questions/search", params={"q": "helm"}).json()] == [created["id"]]
+    client.put(f"/questions/{created['id']}", json={"question": "Kustomize", "answer": "Overlays", "topic": "Kubernetes", "difficulty": "Hard"})
+    assert client.get("/questions/search", params={"q": "helm"}).json() == []
+    assert [q["id"] for q in client.get("/questions/search", params={"q": "overlays"}).json()] == [created["id"]]
+    client.delete(f"/questions/{created['id']}")
+    assert client.get("/questions/search", params={"q": "overlays"}).json() == []
+
 def test_create_user(db_session):
     response = client.post(
         "/users/",
@@ -315,4 +492,203 @@ def test_cancel_limit_order(db_session):
     order_id = order_response.json()["id"]
 
     response = client.delete(f"/orders/{order_id}", headers=headers)
-    assert response.status_code == 204
\ No newline at end of file
+    assert response.status_code == 204
+
+def test_match_orders_fills_crossed_orders(db_session, monkeypatch):
+    from app import worker
+    from app.models import Order, Wallet
+
+    monkeypatch.setattr(worker, "_order_books", {})
+
+    client.post(
+        "/users/",
+        json={"username": "testuser", "password": "testpassword"},
+    )
+    response = client.post(
+        "/token",
+        data={"username": "testuser", "password": "testpassword"},
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    crossed = client.post(
+        "/orders/",
+        headers=headers,
+        json={"order_type": "buy", "btc_amount": 1, "price_usd": 50000},
+    ).json()
+    resting = client.post(
+        "/orders/",
+        headers=headers,
+        json={"order_type": "buy", "btc_amount": 1, "price_usd": 40000},
+    ).json()
+
+    assert worker.match_orders(db_session, 45000.0) == 1
+    assert worker.match_orders(db_session, 45000.0) == 0
+
+    assert db_session.get(Order, crossed["id"]).is_active == False
+    assert db_session.get(Order, resting["id"]).is_active == True
+    assert resting["id"] in worker._order_books[(0, 1)]
+    wallet = db_session.query(Wallet).first()
+    assert wallet.usd_balance == 100000.0 - 50000.0
+    assert wallet.btc_balance == 1.0
+
+def test_sharded_matching_in_eager_mode(db_session, monkeypatch):
+    from app import worker
+    from app.models import Order, User, Wallet
+
+    monkeypatch.setattr(worker, "_order_books", {})
+    monkeypatch.setattr("app.database.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(worker.celery.conf, "task_always_eager", True)
+
+    for i in range(4):
+        user = User(username=f"trader{i}", hashed_password="x")
+        db_session.add(user)
+        db_session.flush()
+        wallet = Wallet(user_id=user.id, btc_balance=1.0, usd_balance=100000.0)
+        db_session.add(wallet)
+        db_session.flush()
+        db_session.add(Order(wallet_id=wallet.id, order_type="buy", btc_amount=1.0, price_usd=50000.0))
+        db_session.add(Order(wallet_id=wallet.id, order_type="sell", btc_amount=1.0, price_usd=60000.0))
+    db_session.commit()
+
+    stats = worker.dispatch_price(45000.0, shard_count=2).get()
+    assert stats["shards"] == 2
+    assert stats["fills"] == 4
+    assert stats["usd_amount"] == 4 * 50000.0
+    assert set(worker._order_books) == {(0, 2), (1, 2)}
+    for book in worker._order_books.values():
+        assert len(book) == 2  # the resting sells of the shard's two wallets
+
+def test_transactions_keyset_pagination_and_export(db_session, monkeypatch):
+    async def mock_get_btc_price_usd():
+        return 1000.0
+    monkeypatch.setattr("app.api_client.get_btc_price_usd", mock_get_btc_price_usd)
+
+    client.post(
+        "/users/",
+        json={"username": "testuser", "password": "testpassword"},
+    )
+    response = client.post(
+        "/token",
+        data={"username": "testuser", "password": "testpassword"},
+    )
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for amount in (1, 2, 3, 4, 5):
+        client.post(f"/buy/?btc_amount={amount}", headers=headers)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/transactions/", headers=headers, params=params)
+        assert response.status_code == 200
+        seen.extend(item["btc_amount"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [5, 4, 3, 2, 1]
+
+    response = client.get("/transactions/", headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    response = client.get("/transactions/", headers=headers, params={"cursor": pagination.encode_cursor(1, 2)})
+    assert response.status_code == 400
+
+    response = client.get("/transactions/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["btc_amount"] for row in rows] == [1, 2, 3, 4, 5]
+
+def test_wallet_served_from_ledger_projection(db_session, monkeypatch):
+    from app import matcher
+    from app.config import settings
+    from app.models import Order, Wallet
+
+    async def mock_get_btc_price_usd():
+        return 1000.0
+    monkeypatch.setattr("app.api_client.get_btc_price_usd", mock_get_btc_price_usd)
+    monkeypatch.setattr(settings, "LEDGER_ENABLED", True)
+    monkeypatch.setattr(wallet_ledger, "poll_interval", 0)
+    monkeypatch.setattr("app.database.SessionLocal", TestingSessionLocal)
+
+    client.post("/users/", json={"username": "testuser", "password": "testpassword"})
+    token = client.post("/token", data={"username": "testuser", "password": "testpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/wallet/", headers=headers).json()["usd_balance"] == 100000.0
+    client.post("/buy/?btc_amount=2", headers=headers)
+    assert wallet_ledger.events_applied == 0  # the trade's own balances were recorded
+
+    # A fill written by the worker reaches the projection on the next poll.
+    wallet = db_session.query(Wallet).one()
+    order = Order(wallet_id=wallet.id, order_type="sell", btc_amount_sats=10**8, price_cents=150000)
+    db_session.add(order)
+    db_session.flush()
+    matcher.apply_fills(db_session, [matcher.Fill(order.id, wallet.id, "sell", 10**8, 150000)])
+    db_session.commit()
+    data = client.get("/wallet/", headers=headers).json()
+    assert (data["btc_balance"], data["usd_balance"]) == (1.0, 100000.0 - 2000.0 + 1500.0)
+    assert wallet_ledger.events_applied == 1
+
+def test_trades_through_group_commit(db_session, monkeypatch):
+    from app.config import settings
+    from app.group_commit import trade_committer
+
+    async def mock_get_btc_price_usd():
+        return 1000.0
+    monkeypatch.setattr("app.api_client.get_btc_price_usd", mock_get_btc_price_usd)
+    monkeypatch.setattr(settings, "GROUP_COMMIT_ENABLED", True)
+    monkeypatch.setattr(trade_committer, "session_factory", AsyncTestingSessionLocal)
+
+    client.post("/users/", json={"username": "testuser", "password": "testpassword"})
+    token = client.post("/token", data={"username": "testuser", "password": "testpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    batches = trade_committer.batches
+    response = client.post("/buy/?btc_amount=2", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["usd_balance"] == 98000.0
+    response = client.post("/sell/?btc_amount=3", headers=headers)
+    assert response.status_code == 400
+    assert trade_committer.batches == batches + 2
+
+def test_login_rehashes_outdated_password_hash(db_session, monkeypatch):
+    from passlib.context import CryptContext
+    from app.models import User
+
+    weak_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("testpassword")
+    db_session.add(User(username="legacy", hashed_password=weak_hash))
+    db_session.commit()
+
+    response = client.post(
+        "/token",
+        data={"username": "legacy", "password": "testpassword"},
+    )
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    user = db_session.query(User).filter(User.username == "legacy").first()
+    assert user.hashed_password != weak_hash
+    assert not user.hashed_password.startswith("$2b$04$")
+
+    assert read_metrics(monkeypatch)["password_hasher"]["completed"] >= 1
+
+def test_metrics_require_the_metrics_token(db_session, monkeypatch):
+    assert client.get("/metrics").status_code == 404  # off without METRICS_TOKEN
+    assert read_metrics(monkeypatch)["password_hasher"]["workers"] >= 1
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+def test_shard_already_matching_is_skipped(db_session, monkeypatch):
+    from app import worker
+
+    monkeypatch.setattr(worker, "_order_books", {})
+    monkeypatch.setattr("app.database.SessionLocal", TestingSessionLocal)
+    with worker.shard_lock(db_session, 1) as locked:
+        assert locked
+        stats = worker.match_shard(50000.0, 1, 2)
+        assert stats["skipped"] and stats["fills"] == 0
+        assert not worker._order_books
+    assert not worker.match_shard(50000.0, 1, 2)["skipped"]
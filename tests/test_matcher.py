@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app import matcher, models
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'matcher.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Wallet), [
+            {"id": i, "user_id": i, "btc_balance_sats": 10**8, "usd_balance_cents": 10**7} for i in (1, 2)
+        ])
+        conn.execute(insert(models.Order), [
+            {"id": i, "wallet_id": i, "order_type": "buy", "btc_amount_sats": 10**7,
+             "price_cents": 5_000_000, "is_active": True}
+            for i in (1, 2)
+        ])
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def balances(db):
+    return dict(db.execute(select(models.Wallet.id, models.Wallet.usd_balance_cents)).all())
+
+
+def test_fill_of_a_cancelled_order_is_dropped(db):
+    db.execute(update(models.Order).where(models.Order.id == 2).values(is_active=False))
+    db.commit()
+
+    fills = [matcher.Fill(i, i, "buy", 10**7, 500_000) for i in (1, 2)]
+    assert [fill.order_id for fill in matcher.apply_fills(db, fills)] == [1]
+    db.commit()
+    assert balances(db) == {1: 10**7 - 500_000, 2: 10**7}
+    assert db.scalar(select(models.Transaction.order_id)) == 1
+
+
+def test_fills_a_wallet_can_no_longer_cover_are_refused(db):
+    # Wallet 2 spent its dollars after its fill was computed.
+    db.execute(update(models.Wallet).where(models.Wallet.id == 2).values(usd_balance_cents=0))
+    db.commit()
+
+    fills = [matcher.Fill(i, i, "buy", 10**7, 500_000) for i in (1, 2)]
+    with pytest.raises(matcher.BalanceConflict):
+        matcher.apply_fills(db, fills)
+    db.rollback()
+    assert balances(db) == {1: 10**7, 2: 0}
+    assert db.scalar(select(models.Order.is_active).where(models.Order.id == 1))
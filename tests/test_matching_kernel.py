@@ -0,0 +1,79 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from app import matcher, matching_kernel
+from app.order_book import BookOrder, OrderBook
+
+
+def random_book(seed, order_count=3000, wallet_count=200):
+    rng = random.Random(seed)
+    orders = [
+        BookOrder(
+            order_id,
+            rng.randrange(1, wallet_count + 1),
+            rng.choice(["buy", "sell"]),
+            rng.randrange(1, 5 * 10**8),
+            rng.randrange(4_900_000, 5_100_000),
+        )
+        for order_id in range(1, order_count + 1)
+    ]
+    book = OrderBook()
+    for order in orders:
+        book.add(order)
+    # Tight balances so many wallets run out part way; wallet 1 has none at all.
+    balances = {
+        wallet_id: [rng.randrange(0, 10**9), rng.randrange(0, 5 * 10**6)]
+        for wallet_id in range(2, wallet_count + 1)
+    }
+    return orders, book, balances
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_kernel_fills_match_the_python_matcher(seed):
+    _, book, balances = random_book(seed)
+    candidates = book.crossed(5_000_000)
+    expected_balances = copy.deepcopy(balances)
+    expected = matcher.compute_fills(candidates, expected_balances)
+
+    fills = matching_kernel.compute_fills(candidates, balances)
+    assert fills == expected
+    assert balances == expected_balances
+    assert 0 < len(fills) < len(candidates)
+
+
+def test_match_crosses_and_orders_like_the_book():
+    rows, book, balances = random_book(7)
+    orders = matching_kernel.OrderArrays.from_rows(
+        (order.id, order.wallet_id, order.order_type, order.btc_amount_sats, order.price_cents) for order in rows
+    )
+    positions = matching_kernel.crossed_in_priority(orders, 5_000_000)
+    assert orders.id[positions].tolist() == [order.id for order in book.crossed(5_000_000)]
+
+    filled, usd_amounts = matching_kernel.match(orders, matching_kernel.BalanceArrays.from_dict(balances), 5_000_000)
+    priority = matching_kernel.in_priority(filled)
+    expected = matcher.compute_fills(book.crossed(5_000_000), copy.deepcopy(balances))
+    assert filled.id[priority].tolist() == [fill.order_id for fill in expected]
+    assert usd_amounts[priority].tolist() == [fill.usd_amount_cents for fill in expected]
+
+
+def test_sparse_wallet_ids_are_looked_up():
+    balances = matching_kernel.BalanceArrays.from_dict({10**12: [0, 0], 5: [0, 0]})
+    index, found = balances.lookup(np.array([5, 6, 10**12, -1], dtype=np.int64))
+    assert found.tolist() == [True, False, True, False]
+    assert index[found].tolist() == [0, 1]
+
+
+def test_overflowing_notional_is_refused():
+    orders = matching_kernel.OrderArrays.from_rows([(1, 1, "buy", 2**40, 2**40)])
+    balances = matching_kernel.BalanceArrays.from_dict({1: [0, 0]})
+    with pytest.raises(OverflowError):
+        matching_kernel.fill_orders(orders, balances)
+
+
+def test_empty_inputs():
+    orders = matching_kernel.OrderArrays.from_rows([])
+    filled, usd_amounts = matching_kernel.match(orders, matching_kernel.BalanceArrays.from_dict({}), 5_000_000)
+    assert len(filled) == 0 and usd_amounts.dtype == np.int64
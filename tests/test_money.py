@@ -0,0 +1,26 @@
+from app import models
+from app.money import btc_to_sats, cost_cents, proceeds_cents, sats_to_btc, usd_to_cents
+
+
+def test_conversions_are_exact_at_the_edges():
+    assert btc_to_sats(0.1) == 10_000_000
+    assert btc_to_sats(0.1) + btc_to_sats(0.2) == btc_to_sats(0.3)
+    assert usd_to_cents(19.99) == 1999
+    assert usd_to_cents(0.005) == 0  # ties round to even
+    assert usd_to_cents(0.015) == 2
+    assert sats_to_btc(btc_to_sats(1.23456789)) == 1.23456789
+
+
+def test_buys_round_up_and_sells_round_down():
+    price = usd_to_cents(50000.01)
+    assert cost_cents(1, price) == 1
+    assert proceeds_cents(1, price) == 0
+    assert (cost_cents(btc_to_sats(0.5), price), proceeds_cents(btc_to_sats(0.5), price)) == (2500001, 2500000)
+
+
+def test_models_expose_float_views_of_integer_columns():
+    wallet = models.Wallet(btc_balance=0.3, usd_balance=100.1)
+    assert (wallet.btc_balance_sats, wallet.usd_balance_cents) == (30_000_000, 10010)
+    assert (wallet.btc_balance, wallet.usd_balance) == (0.3, 100.1)
+    order = models.Order(btc_amount=None, price_usd=50000.0)
+    assert order.btc_amount is None and order.price_cents == 5_000_000
@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.order_book import OrderBook
+
+
+def test_sync_picks_up_orders_that_commit_out_of_id_order(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'book.db'}")
+    models.Base.metadata.create_all(bind=engine)
+
+    def place(order_id):
+        with engine.begin() as conn:
+            conn.execute(insert(models.Order), [{
+                "id": order_id, "wallet_id": 1, "order_type": "buy",
+                "btc_amount_sats": 10**8, "price_cents": 5_000_000, "is_active": True,
+            }])
+
+    with sessionmaker(bind=engine)() as db:
+        book = OrderBook(settle_seconds=60)
+        place(1)
+        book.load(db)
+        place(10)
+        book.sync(db)
+        place(5)  # took its id before order 10 but committed after it
+        book.sync(db)
+        assert {order.id for order in book.crossed(5_000_000)} == {1, 5, 10}
+
+        settled = OrderBook(settle_seconds=0)
+        settled.load(db)
+        assert settled.settled_id == 10
+    engine.dispose()
@@ -0,0 +1,26 @@
+import datetime
+
+import pytest
+
+from app import pagination
+
+
+def test_cursor_round_trips_its_sort_key():
+    timestamp = datetime.datetime(2026, 10, 18, 12, 30)
+    cursor = pagination.encode_cursor(timestamp, 42)
+    assert pagination.decode_cursor(cursor, datetime.datetime, int) == [timestamp, 42]
+
+
+@pytest.mark.parametrize("values, types", [
+    (["x"], (int,)),
+    ([True], (int,)),
+    ([1.5], (int,)),
+    ([2**40], (int,)),
+    ([7, 7], (datetime.datetime, int)),
+    ([{"dt": "not a date"}, 7], (datetime.datetime, int)),
+    ([1, 2], (int,)),
+])
+def test_mistyped_cursors_are_invalid(values, types):
+    cursor = pagination.encode_cursor(*values)
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, *types)
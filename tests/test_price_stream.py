@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from app import price_stream
+from app.api_client import PriceQuote
+
+
+class ScriptedFeed:
+    def __init__(self, prices):
+        self.prices = list(prices)
+
+    async def get_quote(self):
+        price = self.prices.pop(0)
+        if price is None:
+            return PriceQuote(50000.0, 0.0, "fallback", 1.0)
+        return PriceQuote(price, time.monotonic(), "live", 1.0)
+
+
+def test_ticker_publishes_only_price_changes():
+    ticker = price_stream.PriceTicker(ScriptedFeed([100.0, 100.0, None, 101.0]), poll_interval=0, heartbeat=60)
+    queue = ticker.subscribe()
+    published = []
+
+    async def poll():
+        for _ in range(4):
+            await ticker.poll_once()
+            if not queue.empty():
+                published.append(queue.get_nowait())
+
+    asyncio.run(poll())
+    assert published == [100.0, 101.0]
+
+
+def test_slow_subscriber_only_sees_latest_tick():
+    ticker = price_stream.PriceTicker(ScriptedFeed([]), poll_interval=0, heartbeat=60)
+
+    async def publish():
+        queue = ticker.subscribe()
+        for price in (1.0, 2.0, 3.0):
+            ticker.publish(price)
+        return queue.qsize(), queue.get_nowait()
+
+    assert asyncio.run(publish()) == (1, 3.0)
+
+
+def test_matcher_runs_on_each_tick(monkeypatch):
+    matched = []
+    monkeypatch.setattr(price_stream, "_match_tick", lambda price: matched.append(price) or 0)
+
+    async def drive():
+        queue = asyncio.Queue(maxsize=1)
+        task = asyncio.ensure_future(price_stream.run_matcher(queue, min_interval=0))
+        for price in (10.0, 11.0):
+            await queue.put(price)
+            await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(drive())
+    assert matched == [10.0, 11.0]
+
+
+def test_matcher_survives_a_failed_tick(monkeypatch):
+    matched = []
+
+    def match_tick(price):
+        if price == 10.0:
+            raise RuntimeError("database went away")
+        matched.append(price)
+        return 0
+    monkeypatch.setattr(price_stream, "_match_tick", match_tick)
+
+    async def drive():
+        queue = asyncio.Queue(maxsize=1)
+        task = asyncio.ensure_future(price_stream.run_matcher(queue, min_interval=0))
+        for price in (10.0, 11.0):
+            await queue.put(price)
+            await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(drive())
+    assert matched == [11.0]
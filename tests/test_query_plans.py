@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from app import models
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, statement):
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_wallet_lookup_by_user_uses_index(engine):
+    plan = query_plan(engine, select(models.Wallet).where(models.Wallet.user_id == 1))
+    assert "USING INDEX ix_wallets_user_id" in plan
+
+
+def test_wallet_transactions_use_wallet_timestamp_index(engine):
+    plan = query_plan(
+        engine,
+        select(models.Transaction)
+        .where(models.Transaction.wallet_id == 1)
+        .order_by(models.Transaction.timestamp.desc(), models.Transaction.id.desc()),
+    )
+    assert "USING INDEX ix_transactions_wallet_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_crossed_orders_use_partial_active_index(engine):
+    plan = query_plan(
+        engine,
+        select(models.Order.id).where(
+            models.Order.is_active == True,
+            models.Order.order_type == "buy",
+            models.Order.price_cents >= 5000000,
+        ),
+    )
+    assert "USING INDEX ix_orders_active_type_price" in plan
+
+
+def test_orders_by_wallet_use_index(engine):
+    plan = query_plan(engine, select(models.Order).where(models.Order.wallet_id == 1))
+    assert "USING INDEX ix_orders_wallet_id" in plan
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({"topic": "Docker", "difficulty": "Easy"}, "ix_questions_topic_difficulty_id"),
+    ({"topic": "Docker"}, "ix_questions_topic_id"),
+    ({"difficulty": "Easy"}, "ix_questions_difficulty_id"),
+])
+def test_filtered_question_pages_use_an_index_without_sorting(engine, filters, index):
+    plan = query_plan(
+        engine,
+        select(models.Question)
+        .filter_by(**filters)
+        .where(models.Question.id > 100)
+        .order_by(models.Question.id)
+        .limit(10),
+    )
+    assert f"USING INDEX {index}" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,64 @@
+import asyncio
+from collections import Counter
+
+from app.sampling import QuestionSampler
+
+
+def make_sampler(count=1000):
+    sampler = QuestionSampler()
+    for question_id in range(count):
+        sampler.add(question_id, "Docker" if question_id % 2 else "Linux", "Easy" if question_id % 3 else "Hard")
+    return sampler
+
+
+def test_add_and_discard_keep_buckets_consistent():
+    sampler = make_sampler(10)
+    sampler.discard(3)
+    sampler.discard(3)
+    sampler.add(4, "Docker", "Easy")  # moves from (Linux, Easy)
+    sampler.add(5, "Docker", "Easy")  # already there
+    assert len(sampler) == 9
+    assert sorted(sampler.sample(10, "Docker", "Easy")) == [1, 4, 5, 7]
+    for question_id in range(10):
+        sampler.discard(question_id)
+    assert len(sampler) == 0 and sampler.sample(5) == []
+
+
+def test_sample_is_distinct_filtered_and_seeded():
+    sampler = make_sampler()
+    sample = sampler.sample(50, topic="Docker", seed=1)
+    assert len(set(sample)) == 50
+    assert all(question_id % 2 for question_id in sample)
+    assert sampler.sample(50, topic="Docker", seed=1) == sample
+    assert sampler.sample(50, topic="Docker", seed=2) != sample
+
+
+def test_sample_honours_exclusions_when_the_pool_runs_low():
+    sampler = make_sampler(20)
+    pool = [question_id for question_id in range(20) if question_id % 2]
+    assert sorted(sampler.sample(100, topic="Docker", exclude=pool[:7])) == pool[7:]
+
+
+def test_sample_is_roughly_uniform():
+    sampler = make_sampler(100)
+    counts = Counter(question_id for seed in range(2000) for question_id in sampler.sample(5, seed=seed))
+    assert len(counts) == 100
+    assert max(counts.values()) < 3 * min(counts.values())
+
+
+def test_reload_keeps_serving_and_keeps_writes_made_while_reading():
+    sampler = make_sampler(4)
+
+    class SlowSession:
+        async def execute(self, query):
+            # Both writes are committed after the rows below were read.
+            assert len(sampler.sample(10)) == 4
+            sampler.add(9, "Linux", "Hard")
+            sampler.discard(0)
+            await asyncio.sleep(0)
+            return [(0, "Linux", "Hard"), (1, "Docker", "Easy"), (2, "Linux", "Easy")]
+
+    asyncio.run(sampler.load(SlowSession()))
+    assert sorted(sampler.sample(10)) == [1, 2, 9]
+    sampler.add(3, "Docker", "Hard")  # writes after the reload aren't queued
+    assert sampler._pending is None and len(sampler) == 4
@@ -0,0 +1,39 @@
+import asyncio
+
+from app import trades
+from app.money import btc_to_sats, usd_to_cents
+
+
+async def _trade_concurrently(Session, trade, wallet_id, count, btc_amount, usd_amount):
+    async def one():
+        async with Session() as db:
+            return await trade(db, wallet_id, btc_amount, usd_amount)
+
+    return await asyncio.gather(*(one() for _ in range(count)))
+
+
+def test_concurrent_buys_never_overdraw(setup_wallet, wallet_state):
+    async def scenario():
+        Session, wallet_id = await setup_wallet(usd_balance=100000.0, btc_balance=0.0)
+        results = await _trade_concurrently(Session, trades.buy, wallet_id, 50, btc_to_sats(0.1), usd_to_cents(5000.0))
+        return results, await wallet_state(Session)
+
+    results, (wallet, transaction_count) = asyncio.run(scenario())
+    filled = [result for result in results if result is not None]
+    assert len(filled) == 20
+    assert transaction_count == 20
+    assert wallet.usd_balance == 0.0
+    assert wallet.btc_balance_sats == btc_to_sats(2.0)  # exact: twenty 0.1 BTC fills sum to 2 BTC
+
+
+def test_concurrent_sells_never_oversell(setup_wallet, wallet_state):
+    async def scenario():
+        Session, wallet_id = await setup_wallet(usd_balance=0.0, btc_balance=3.0)
+        results = await _trade_concurrently(Session, trades.sell, wallet_id, 40, btc_to_sats(0.5), usd_to_cents(25000.0))
+        return results, await wallet_state(Session)
+
+    results, (wallet, transaction_count) = asyncio.run(scenario())
+    assert sum(result is not None for result in results) == 6
+    assert transaction_count == 6
+    assert wallet.btc_balance == 0.0
+    assert wallet.usd_balance == 150000.0